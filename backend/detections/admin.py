@@ -3,5 +3,10 @@ from .models import DetectionJob
 
 @admin.register(DetectionJob)
 class DetectionJobAdmin(admin.ModelAdmin):
-    list_display = ("id", "status", "progress", "confidence", "created_at")
-    search_fields = ("id",)
+    list_display = ("id", "status", "priority", "client_id", "progress", "confidence", "created_at")
+    list_filter = ("status", "priority", "model_name", "model_version")
+    search_fields = ("id", "client_id", "image_hash")
+
+    def get_queryset(self, request):
+        # Results can be large; the changelist never shows them
+        return super().get_queryset(request).defer("result", "result_blob")
@@ -0,0 +1,158 @@
+# detections/analytics.py
+"""
+Cross-job analytics with incrementally maintained counters.
+
+When a job finishes, `record_job()` stores a JobSummary (counts per class,
+confidence histogram, detections per megapixel) and adds it into the
+AggregateCounter rows for its day and tag, per model and class. Queries
+then read only those rows, so their cost does not grow with the number of
+jobs. Re-recording a job first subtracts its previous summary, keeping the
+totals exact when a job is re-run.
+"""
+from __future__ import annotations
+
+from datetime import date
+from itertools import zip_longest
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import transaction
+
+from .models import AggregateCounter, DetectionJob, JobSummary
+
+HIST_BINS = 10   # confidence histogram: [0, .1), [.1, .2), ... [.9, 1.0]
+
+
+def _hist(confs) -> List[int]:
+    bins = [0] * HIST_BINS
+    for c in confs:
+        bins[min(int(float(c) * HIST_BINS), HIST_BINS - 1)] += 1
+    return bins
+
+
+def _add_hist(a: List[int], b: List[int], sign: int) -> List[int]:
+    return [x + sign * y for x, y in zip_longest(a or [], b or [], fillvalue=0)]
+
+
+def summarize(job: DetectionJob, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary fields for a finished job's result payload."""
+    dets = payload.get("detections") or []
+    mp = (payload.get("image_width") or 0) * (payload.get("image_height") or 0) / 1e6
+    counts: Dict[str, int] = {}
+    per_class: Dict[str, List[float]] = {}
+    for d in dets:
+        name = str(d.get("class", ""))
+        counts[name] = counts.get(name, 0) + 1
+        per_class.setdefault(name, []).append(d.get("confidence", 0.0))
+    return {
+        "model_name": job.model_name,
+        "tag": job.tag,
+        "day": (job.created_at.date() if job.created_at else date.today()),
+        "detection_count": len(dets),
+        "megapixels": round(mp, 4),
+        "density_per_mp": round(len(dets) / mp, 4) if mp else 0.0,
+        "class_counts": counts,
+        "conf_hist": _hist(d.get("confidence", 0.0) for d in dets),
+        "class_conf_hist": {k: _hist(v) for k, v in per_class.items()},
+    }
+
+
+def _deltas(s: JobSummary) -> List[Tuple[str, str, str, Dict[str, Any]]]:
+    """(scope, key, class_name, increments) rows a summary contributes to."""
+    keys = [(AggregateCounter.SCOPE_DAY, s.day.isoformat())]
+    if s.tag:
+        keys.append((AggregateCounter.SCOPE_TAG, s.tag))
+    rows = []
+    for scope, key in keys:
+        rows.append((scope, key, "", {
+            "job_count": 1,
+            "positive_job_count": 1 if s.detection_count else 0,
+            "detection_count": s.detection_count,
+            "megapixels": s.megapixels,
+            "conf_hist": s.conf_hist,
+        }))
+        for cls, n in s.class_counts.items():
+            rows.append((scope, key, cls, {
+                "job_count": 0,
+                "positive_job_count": 1 if n else 0,
+                "detection_count": n,
+                "megapixels": 0.0,
+                "conf_hist": s.class_conf_hist.get(cls, []),
+            }))
+    # Lock rows in a fixed order so concurrent tasks cannot deadlock
+    return sorted(rows, key=lambda r: r[:3])
+
+
+def _apply(s: JobSummary, sign: int) -> None:
+    for scope, key, cls, inc in _deltas(s):
+        row, _ = AggregateCounter.objects.select_for_update().get_or_create(
+            scope=scope, key=key, model_name=s.model_name, class_name=cls,
+        )
+        row.job_count += sign * inc["job_count"]
+        row.positive_job_count += sign * inc["positive_job_count"]
+        row.detection_count += sign * inc["detection_count"]
+        row.megapixels += sign * inc["megapixels"]
+        row.conf_hist = _add_hist(row.conf_hist, inc["conf_hist"], sign)
+        row.save()
+
+
+def record_job(job: DetectionJob, payload: Dict[str, Any]) -> JobSummary:
+    """Store the job's summary and roll it into the day/tag counters (replacing any previous one)."""
+    with transaction.atomic():
+        old = JobSummary.objects.select_for_update().filter(job=job).first()
+        if old is not None:
+            _apply(old, -1)
+        summary, _ = JobSummary.objects.update_or_create(job=job, defaults=summarize(job, payload))
+        _apply(summary, +1)
+    return summary
+
+
+def query(
+    scope: str,
+    model_name: Optional[str] = None,
+    class_name: str = "",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    One row per (key, model) for `scope`; `class_name` narrows counts to one class.
+    start/end bound the key (ISO dates for "day", lexical for "tag").
+    """
+    qs = AggregateCounter.objects.filter(scope=scope, class_name__in={"", class_name})
+    if model_name:
+        qs = qs.filter(model_name=model_name)
+    if start:
+        qs = qs.filter(key__gte=start)
+    if end:
+        qs = qs.filter(key__lte=end)
+
+    totals: Dict[Tuple[str, str], AggregateCounter] = {}
+    picked: Dict[Tuple[str, str], AggregateCounter] = {}
+    for row in qs.order_by("key", "model_name"):
+        k = (row.key, row.model_name)
+        if row.class_name == "":
+            totals[k] = row
+        if row.class_name == class_name:
+            picked[k] = row
+
+    out = []
+    for k, total in totals.items():
+        row = picked.get(k)
+        jobs = total.job_count
+        if jobs <= 0:
+            continue
+        detections = row.detection_count if row else 0
+        positive = row.positive_job_count if row else 0
+        out.append({
+            "key": k[0],
+            "model": k[1],
+            "class": class_name or None,
+            "jobs": jobs,
+            "detections": detections,
+            "detections_per_image": round(detections / jobs, 3),
+            "positive_jobs": positive,
+            "positive_rate": round(positive / jobs, 4),
+            "megapixels": round(total.megapixels, 3),
+            "density_per_mp": round(detections / total.megapixels, 3) if total.megapixels else None,
+            "conf_hist": row.conf_hist if row else [0] * HIST_BINS,
+        })
+    return out
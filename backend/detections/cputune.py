@@ -0,0 +1,169 @@
+# detections/cputune.py
+"""
+CPU thread/process topology for inference workers.
+
+`manage.py tune_cpu` benchmarks predict under several (processes x threads)
+layouts and writes the winner to CPU_TUNING_FILE. That file is then applied:
+
+  - server/celery.py -> `apply_env()` before torch is imported, so OpenMP/MKL
+    pools are sized correctly (explicit env vars still win)
+  - settings.py      -> CELERY_WORKER_CONCURRENCY = "processes"
+  - load_model()     -> `apply_torch_threads()` for intra/inter-op threads
+
+Without a tuning file nothing changes except the oversubscription warning
+logged when the worker starts.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TUNING_FILE = os.environ.get(
+    "CPU_TUNING_FILE", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cpu_tuning.json")
+)
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_applied_torch = False
+
+
+def cpu_count() -> int:
+    """CPUs this process may run on (respects affinity/cgroup cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_tuning(path: str = TUNING_FILE) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def apply_env(config: Optional[Dict[str, Any]] = None) -> None:
+    """Size OpenMP/MKL pools from the tuning file. Must run before torch is imported."""
+    config = load_tuning() if config is None else config
+    threads = config.get("intra_op_threads")
+    if not threads:
+        return
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(threads))
+
+
+def apply_torch_threads(config: Optional[Dict[str, Any]] = None) -> None:
+    """Apply torch intra/inter-op thread counts once per process (called from load_model)."""
+    global _applied_torch
+    if _applied_torch:
+        return
+    _applied_torch = True
+    config = load_tuning() if config is None else config
+    if not config.get("intra_op_threads"):
+        return
+    import torch
+
+    torch.set_num_threads(int(config["intra_op_threads"]))
+    try:
+        torch.set_num_interop_threads(int(config.get("inter_op_threads", 1)))
+    except RuntimeError:
+        # Only allowed before the first parallel op; keep whatever is in place.
+        pass
+
+
+def torch_threads_per_process() -> int:
+    """Threads each worker process will use for intra-op work."""
+    config = load_tuning()
+    if config.get("intra_op_threads"):
+        return int(config["intra_op_threads"])
+    if os.environ.get("OMP_NUM_THREADS"):
+        return int(os.environ["OMP_NUM_THREADS"])
+    # torch defaults to one thread per physical core visible to the process
+    return cpu_count()
+
+
+def check_oversubscription(processes: int) -> None:
+    threads = torch_threads_per_process()
+    cores = cpu_count()
+    if processes * threads > cores:
+        logger.warning(
+            "CPU oversubscribed: %d worker processes x %d threads = %d > %d cores. "
+            "Run `python manage.py tune_cpu` or set OMP_NUM_THREADS / --concurrency.",
+            processes, threads, processes * threads, cores,
+        )
+
+
+# ---------- benchmarking ----------
+def candidate_layouts(cores: int) -> List[Dict[str, int]]:
+    """(processes, threads) pairs that fit the machine, from one big process to one thread each."""
+    layouts = []
+    p = 1
+    while p <= cores:
+        for t in {max(cores // p, 1), max(cores // (2 * p), 1)}:
+            layouts.append({"processes": p, "intra_op_threads": t})
+        p *= 2
+    if cores & (cores - 1):  # not a power of two: also try one process per core
+        layouts.append({"processes": cores, "intra_op_threads": 1})
+    return sorted({(d["processes"], d["intra_op_threads"]): d for d in layouts}.values(),
+                  key=lambda d: (d["processes"], d["intra_op_threads"]))
+
+
+def _bench_worker(weights: str, threads: int, imgsz: int, seconds: float, barrier, out) -> None:
+    """Runs in a fresh (spawned) process so thread env vars take effect before torch loads."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    import numpy as np
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    model = YOLO(weights)
+    frame = np.random.default_rng(0).integers(0, 255, (imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(2):  # warm-up
+        model.predict(frame, imgsz=imgsz, verbose=False)
+
+    barrier.wait()
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        model.predict(frame, imgsz=imgsz, verbose=False)
+        n += 1
+    out.put((n, time.perf_counter() - t0))
+
+
+def benchmark(weights: str, processes: int, threads: int, imgsz: int = 640, seconds: float = 10.0) -> Dict[str, float]:
+    """Aggregate images/s and mean per-image latency for one layout."""
+    import multiprocessing as mp
+    import queue
+
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(processes)
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_bench_worker, args=(weights, threads, imgsz, seconds, barrier, out))
+        for _ in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        runs = [out.get(timeout=seconds + 600) for _ in procs]
+    except queue.Empty:
+        raise RuntimeError(f"Benchmark worker did not report back ({processes}x{threads}, {weights})")
+    finally:
+        for p in procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+    images = sum(n for n, _ in runs)
+    latency = sum(el / max(n, 1) for n, el in runs) / len(runs)
+    return {
+        "images_per_s": round(sum(n / el for n, el in runs), 3),
+        "latency_s": round(latency, 4),
+        "images": images,
+    }
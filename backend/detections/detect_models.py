@@ -1,10 +1,15 @@
 # detections/detect_models.py  — FULL FILE REPLACEMENT
+from __future__ import annotations
+
 import os
-from functools import lru_cache
-from typing import Dict, Any, List, Iterable
+from typing import TYPE_CHECKING, Dict, Any, List, Iterable
 
 import numpy as np
-from ultralytics import YOLO
+
+if TYPE_CHECKING:  # ultralytics pulls in torch; only import it when a model is loaded
+    from ultralytics import YOLO
+
+from . import cputune, profiles, roi, versions
 
 APP_DIR = os.path.dirname(__file__)
 
@@ -22,14 +27,32 @@ MODEL_REGISTRY: Dict[str, str] = {
     "third":     os.getenv("MODEL_THIRD",     _fallback("third.pt")),
 }
 
-@lru_cache(maxsize=None)
+# Per-model default inference profile (see profiles.py); a request may override it
+MODEL_PROFILES: Dict[str, str] = {
+    key: os.getenv(f"MODEL_{key.upper()}_PROFILE", profiles.DEFAULT_PROFILE)
+    for key in MODEL_REGISTRY
+}
+
+_loaded: Dict[str, tuple] = {}   # model key -> (weights stamp, model)
+
+
 def load_model(model_name: str) -> YOLO:
+    """Cached per key; reloaded when the weights file is replaced (see versions.stamp)."""
     if model_name not in MODEL_REGISTRY:
         raise ValueError(f"Unknown model '{model_name}'. Valid: {list(MODEL_REGISTRY)}")
     path = MODEL_REGISTRY[model_name]
-    if not os.path.exists(path):
+    current = versions.stamp(path)
+    if current is None:
         raise FileNotFoundError(f"Model weights not found: {path}")
-    return YOLO(path)
+    cached = _loaded.get(model_name)
+    if cached and cached[0] == current:
+        return cached[1]
+    cputune.apply_torch_threads()
+    from ultralytics import YOLO
+
+    model = YOLO(path)
+    _loaded[model_name] = (current, model)
+    return model
 
 # ------------ helpers to coerce shapes safely ------------
 
@@ -159,7 +182,29 @@ def results_to_response(result: Any) -> Dict[str, Any]:
                 })
     return out
 
-def run_inference(model_name: str, image_pil, conf: float = 0.05) -> Dict[str, Any]:
+def run_inference(
+    model_name: str, image_pil, conf: float = 0.05, profile: str | None = None, rois: List[List[float]] | None = None
+) -> Dict[str, Any]:
+    """
+    Detect on a PIL image. With `rois` (flat polygons, see roi.parse_rois) only
+    the bounding rectangles of the polygons are inferred, as one batch, and
+    detections outside the polygons are dropped.
+    """
     model = load_model(model_name)
-    results = model.predict(image_pil, conf=conf, verbose=False)
-    return results_to_response(results[0])
+    w, h = image_pil.size
+    results, windows, prof = roi.predict(
+        model, image_pil, w, h, profile or MODEL_PROFILES.get(model_name), model_name, rois, conf=conf,
+    )
+
+    if windows is None:
+        out = results_to_response(results[0])
+    else:
+        per_window = [results_to_response(r)["detections"] for r in results or []]
+        out = {
+            "image_width": w,
+            "image_height": h,
+            "detections": roi.to_image_coords(per_window, windows, rois, "poly"),
+            "roi": roi.summary(windows, w, h),
+        }
+    out["profile"] = prof
+    return out
@@ -0,0 +1,233 @@
+# detections/engine.py
+"""
+Inference engine interface.
+
+Views and tasks talk to `get_engine()` instead of importing detect_models /
+inference directly, so importing them (migrate, admin, runserver autoreload,
+celery beat) never loads ultralytics or torch. The model stack is imported
+by the first call that actually needs a model.
+
+`Engine.status()` backs the readiness probe: the process is "up" as soon as
+Django serves requests, "ready" once the models in DETECTION_WARM_MODELS
+(default: every model whose weights exist) are loaded and have run once.
+"""
+from __future__ import annotations
+
+import abc
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+
+class Engine(abc.ABC):
+    """What views and tasks need from an inference backend."""
+
+    name = "base"
+
+    def __init__(self):
+        self._warm: set[str] = set()
+        self._warming: Optional[threading.Thread] = None
+        self._warm_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    # --- inference ---
+    @abc.abstractmethod
+    def run_inference(self, model_name: str, image_pil, conf: float = 0.05, profile: Optional[str] = None,
+                      rois: Optional[List[List[float]]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def run_detection(self, image_path: str, confidence: float = 0.25, profile: Optional[str] = None,
+                      rois: Optional[List[List[float]]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        raise NotImplementedError
+
+    # --- models ---
+    @abc.abstractmethod
+    def available_models(self) -> Dict[str, str]:
+        """Model key -> weights path for every model this engine can serve."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load(self, model_name: str) -> Any:
+        raise NotImplementedError
+
+    def model_version(self, model_name: str) -> str:
+        """Short hash of the weights `model_name` currently resolves to ("" if unknown)."""
+        path = self.available_models().get(model_name)
+        return versions.weights_version(path) if path else ""
+
+    def required_models(self) -> List[str]:
+        if settings.DETECTION_WARM_MODELS:
+            return list(settings.DETECTION_WARM_MODELS)
+        return [k for k, path in self.available_models().items() if os.path.exists(path)]
+
+    def warm(self, models: Optional[List[str]] = None) -> List[str]:
+        """Load each model and run one tiny predict so the first real request is not slow."""
+        import numpy as np
+
+        for key in models or self.required_models():
+            if key in self._warm:
+                continue
+            model = self.load(key)
+            if hasattr(model, "predict"):
+                model.predict(np.zeros((64, 64, 3), dtype=np.uint8), imgsz=64, verbose=False)
+            self._mark_warm(key)
+            logger.info("engine=%s model=%s warm", self.name, key)
+        with self._lock:
+            return sorted(self._warm)
+
+    def _mark_warm(self, key: str) -> None:
+        with self._lock:
+            self._warm.add(key)
+
+    def warm_in_background(self) -> None:
+        with self._lock:
+            if self._warming is not None and self._warming.is_alive():
+                return
+            self._warm_error = None
+            self._warming = threading.Thread(target=self._warm_safely, name="engine-warm", daemon=True)
+            self._warming.start()
+
+    def _warm_safely(self) -> None:
+        try:
+            self.warm()
+        except Exception as e:
+            logger.exception("Model warm-up failed")
+            self._warm_error = str(e)
+
+    def status(self) -> Dict[str, Any]:
+        required = self.required_models()
+        with self._lock:
+            warm = sorted(self._warm)
+        return {
+            "engine": self.name,
+            "ready": all(k in warm for k in required),
+            "required": required,
+            "warm": warm,
+            "warming": bool(self._warming and self._warming.is_alive()),
+            "error": self._warm_error,
+        }
+
+
+class UltralyticsEngine(Engine):
+    """YOLO weights via detect_models (sync, per model key) and inference (async OBB model)."""
+
+    name = "ultralytics"
+
+    def run_inference(self, model_name, image_pil, conf=0.05, profile=None, rois=None):
+        from .detect_models import run_inference
+
+        result = run_inference(model_name, image_pil, conf=conf, profile=profile, rois=rois)
+        self._mark_warm(model_name)
+        return result
+
+    def run_detection(self, image_path, confidence=0.25, profile=None, rois=None):
+        from .inference import MODEL_KEY, run_detection
+
+        result = run_detection(image_path, confidence=confidence, profile=profile, rois=rois)
+        self._mark_warm(MODEL_KEY)
+        return result
+
+    def available_models(self):
+        from .detect_models import MODEL_REGISTRY
+        from .inference import MODEL_KEY, MODEL_PATH
+
+        models = dict(MODEL_REGISTRY)
+        models.setdefault(MODEL_KEY, MODEL_PATH)
+        return models
+
+    def load(self, model_name):
+        from .detect_models import load_model
+        from .inference import MODEL_KEY, _get_model
+
+        return _get_model() if model_name == MODEL_KEY else load_model(model_name)
+
+
+class StubEngine(Engine):
+    """
+    Model-free engine for load tests and local development: sleeps in
+    proportion to the pixels inferred and returns synthetic detections in the
+    same shapes as the real engine. Tuned with DETECTION_STUB_SECONDS_PER_MP
+    and DETECTION_STUB_DETECTIONS.
+    """
+
+    name = "stub"
+
+    def _fake(self, width: int, height: int, rois, key: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        import random
+        import time
+
+        from . import roi as roi_mod
+
+        windows = roi_mod.windows_for(rois, width, height) if rois else [(0, 0, width, height)]
+        processed = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in windows)
+        time.sleep(processed / 1e6 * settings.DETECTION_STUB_SECONDS_PER_MP)
+
+        rng = random.Random(width * 7919 + height)
+        dets = []
+        for _ in range(settings.DETECTION_STUB_DETECTIONS if width and height else 0):
+            x, y = rng.uniform(0, max(width - 20, 1)), rng.uniform(0, max(height - 20, 1))
+            s = rng.uniform(8, 20)
+            cls = rng.randint(0, 1)
+            det = {
+                "class": str(cls) if key == "poly" else ("spike", "fhb")[cls],
+                "class_id": cls,
+                "confidence": round(rng.random(), 4),
+                key: [round(v, 2) for v in (x, y, x + s, y, x + s, y + s, x, y + s)],
+            }
+            if not rois or any(roi_mod.point_in_polygon(x + s / 2, y + s / 2, p) for p in rois):
+                dets.append(det)
+        meta = {"image_width": width, "image_height": height, "profile": {"name": "stub", "imgsz": None, "max_det": None}}
+        if rois:
+            meta["roi"] = roi_mod.summary(windows, width, height)
+        return dets, meta
+
+    def run_inference(self, model_name, image_pil, conf=0.05, profile=None, rois=None):
+        if model_name not in self.available_models():
+            raise ValueError(f"Unknown model '{model_name}'. Valid: {list(self.available_models())}")
+        dets, meta = self._fake(*image_pil.size, rois, "poly")
+        return {**meta, "detections": [d for d in dets if d["confidence"] >= conf]}
+
+    def run_detection(self, image_path, confidence=0.25, profile=None, rois=None):
+        from PIL import Image
+
+        with Image.open(image_path) as im:
+            width, height = im.size
+        dets, meta = self._fake(width, height, rois, "polygon")
+        return [d for d in dets if d["confidence"] >= confidence], meta
+
+    def available_models(self):
+        from .detect_models import MODEL_REGISTRY
+
+        return {k: "<stub>" for k in list(MODEL_REGISTRY) + ["obb"]}
+
+    def required_models(self):
+        return []
+
+    def load(self, model_name):
+        return None
+
+    def model_version(self, model_name):
+        return f"stub-{settings.DETECTION_STUB_DETECTIONS}" if model_name in self.available_models() else ""
+
+
+ENGINES = {
+    "ultralytics": "detections.engine.UltralyticsEngine",
+    "stub": "detections.engine.StubEngine",
+}
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """The process-wide engine selected by settings.DETECTION_ENGINE."""
+    path = ENGINES.get(settings.DETECTION_ENGINE, settings.DETECTION_ENGINE)
+    return import_string(path)()
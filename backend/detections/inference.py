@@ -1,27 +1,42 @@
 # detections/inference.py
+from __future__ import annotations
+
 import os
-from typing import List, Dict, Any, Tuple
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple
 from PIL import Image
 import numpy as np
-from ultralytics import YOLO
+
+if TYPE_CHECKING:  # ultralytics pulls in torch; only import it when the model is loaded
+    from ultralytics import YOLO
+
+from . import cputune, profiles, roi, versions
 
 # Path to your OBB weights (must exist; no fallback)
 MODEL_PATH = os.environ.get("MODEL_PATH", "/app/models/obb_best.pt")
+MODEL_KEY = "obb"
+# Default inference profile for async jobs (see profiles.py)
+MODEL_PROFILE = os.environ.get("MODEL_PROFILE", profiles.DEFAULT_PROFILE)
 
 _model: YOLO | None = None
+_model_stamp = None
 
 
 def _get_model() -> YOLO:
-    """Lazy-load OBB model (no fallback, no extras)."""
-    global _model
-    if _model is not None:
+    """Lazy-load OBB model (no fallback, no extras); reloads if the weights file is replaced."""
+    global _model, _model_stamp
+    current = versions.stamp(MODEL_PATH)
+    if _model is not None and current == _model_stamp:
         return _model
     if not os.path.exists(MODEL_PATH):
         raise FileNotFoundError(
             f"MODEL_PATH not found: {MODEL_PATH}. "
             "Mount your OBB weights into the container at this path."
         )
+    cputune.apply_torch_threads()
+    from ultralytics import YOLO
+
     _model = YOLO(MODEL_PATH)
+    _model_stamp = current
     return _model
 
 
@@ -42,9 +57,46 @@ def _poly8(x) -> List[float]:
     return [float(v) for v in flat[:8]]
 
 
-def run_detection(image_path: str, confidence: float = 0.25) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+def _result_detections(r) -> List[Dict[str, Any]]:
+    """OBB detections of one Ultralytics result, in that result's pixel coordinates."""
+    detections: List[Dict[str, Any]] = []
+    names = r.names  # id -> name
+    obb = getattr(r, "obb", None)
+    if obb is None:
+        return detections
+
+    xyxyxyxy = getattr(obb, "xyxyxyxy", None)
+    cls = getattr(obb, "cls", None)
+    confs = getattr(obb, "conf", None)
+    if xyxyxyxy is None or cls is None or confs is None:
+        return detections
+
+    n = int(len(cls))
+    for i in range(n):
+        poly = _poly8(xyxyxyxy[i])
+        cid = int(cls[i])
+        score = float(confs[i])
+        cname = names.get(cid, str(cid)) if isinstance(names, dict) else str(cid)
+
+        detections.append({
+            "class": cname,
+            "class_id": cid,
+            "confidence": score,
+            "polygon": [round(v, 2) for v in poly],
+        })
+    return detections
+
+
+def run_detection(
+    image_path: str,
+    confidence: float = 0.25,
+    profile: str | None = None,
+    rois: List[List[float]] | None = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
-    OBB-only detection.
+    OBB-only detection. `profile` names a profiles.PROFILES entry or "auto";
+    None uses MODEL_PROFILE. With `rois` (flat polygons) only their bounding
+    rectangles are inferred and detections outside the polygons are dropped.
 
     Returns:
       detections: [
@@ -55,38 +107,19 @@ def run_detection(image_path: str, confidence: float = 0.25) -> Tuple[List[Dict[
           "polygon": [x1,y1,x2,y2,x3,y3,x4,y4]   # pixels
         }, ...
       ]
-      meta: {"image_width": int, "image_height": int}
+      meta: {"image_width": int, "image_height": int, "profile": {...}, "roi": {...}?}
     """
     model = _get_model()
-    results = model.predict(source=image_path, conf=confidence, verbose=False, task="obb")
-
-    detections: List[Dict[str, Any]] = []
-    for r in results:
-        names = r.names  # id -> name
-        obb = getattr(r, "obb", None)
-        if obb is None:
-            continue
-
-        xyxyxyxy = getattr(obb, "xyxyxyxy", None)
-        cls = getattr(obb, "cls", None)
-        confs = getattr(obb, "conf", None)
-        if xyxyxyxy is None or cls is None or confs is None:
-            continue
-
-        n = int(len(cls))
-        for i in range(n):
-            poly = _poly8(xyxyxyxy[i])
-            cid = int(cls[i])
-            score = float(confs[i])
-            cname = names.get(cid, str(cid)) if isinstance(names, dict) else str(cid)
-
-            detections.append({
-                "class": cname,
-                "class_id": cid,
-                "confidence": score,
-                "polygon": [round(v, 2) for v in poly],
-            })
-
     w, h = _image_dims(image_path)
-    meta = {"image_width": w, "image_height": h}
+    results, windows, prof = roi.predict(
+        model, image_path, w, h, profile or MODEL_PROFILE, MODEL_KEY, rois, conf=confidence, task="obb",
+    )
+    meta: Dict[str, Any] = {"image_width": w, "image_height": h, "profile": prof}
+
+    if windows is None:
+        detections = [d for r in results for d in _result_detections(r)]
+    else:
+        per_window = [_result_detections(r) for r in results or []]
+        detections = roi.to_image_coords(per_window, windows, rois, "polygon", ndigits=2)
+        meta["roi"] = roi.summary(windows, w, h)
     return detections, meta
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Each entry point runs in a fresh interpreter; {body} is timed from the first import.
+_HARNESS = """
+import json, os, resource, sys, time
+t0 = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+{body}
+elapsed = time.perf_counter() - t0
+# VmHWM is per address space; ru_maxrss would include the parent's peak (kept across exec)
+try:
+    with open("/proc/self/status") as f:
+        peak = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": peak,
+    "heavy": sorted(m for m in ("torch", "ultralytics", "cv2") if m in sys.modules),
+}}))
+"""
+
+ENTRY_POINTS = {
+    "django.setup": "import django; django.setup()",
+    "manage.py check": (
+        "import django; django.setup()\n"
+        "from django.core.management import call_command; call_command('check', verbosity=0)"
+    ),
+    "wsgi + urlconf": (
+        "from server.wsgi import application\n"
+        "from django.urls import get_resolver; get_resolver().url_patterns"
+    ),
+    "celery worker modules": (
+        "import django; django.setup()\n"
+        "from server.celery import app; app.loader.import_default_modules()"
+    ),
+}
+WARM_ENTRY = (
+    "import django; django.setup()\n"
+    "from detections.engine import get_engine; get_engine().warm()"
+)
+
+
+class Command(BaseCommand):
+    help = "Measure import time and peak RSS of each process entry point (fresh interpreter per run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point (median is reported)")
+        parser.add_argument("--with-models", action="store_true", help="Also time warming every required model")
+        parser.add_argument("--json", action="store_true", help="Emit JSON instead of a table")
+
+    def _run(self, body: str) -> dict:
+        env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+        proc = subprocess.run(
+            [sys.executable, "-c", _HARNESS.format(body=body)],
+            cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "entry point failed")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **opts):
+        entries = dict(ENTRY_POINTS)
+        if opts["with_models"]:
+            entries["engine warm"] = WARM_ENTRY
+
+        rows = []
+        for name, body in entries.items():
+            runs = []
+            for _ in range(max(opts["repeat"], 1)):
+                wall = time.perf_counter()
+                r = self._run(body)
+                r["wall_seconds"] = time.perf_counter() - wall
+                runs.append(r)
+            runs.sort(key=lambda r: r["seconds"])
+            mid = runs[len(runs) // 2]
+            rows.append({
+                "entry_point": name,
+                "import_seconds": round(mid["seconds"], 3),
+                "process_seconds": round(mid["wall_seconds"], 3),
+                "max_rss_mb": round(max(r["max_rss_kb"] for r in runs) / 1024, 1),
+                "heavy_modules": mid["heavy"],
+            })
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write(f"{'entry point':<24}{'import s':>10}{'process s':>11}{'max RSS MB':>12}  heavy modules")
+        for r in rows:
+            self.stdout.write(
+                f"{r['entry_point']:<24}{r['import_seconds']:>10.3f}{r['process_seconds']:>11.3f}"
+                f"{r['max_rss_mb']:>12.1f}  {', '.join(r['heavy_modules']) or '-'}"
+            )
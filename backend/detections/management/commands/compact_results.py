@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from detections.models import DetectionJob
+from detections.results import roundtrip_errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encode legacy JSON results of finished jobs as packed blobs "
+        "(detections/results.py), in short batches that skip locked rows. Each blob is "
+        "decoded and compared with the original first; jobs that would not round-trip keep their JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many jobs (0 = all)")
+        parser.add_argument("--dry-run", action="store_true", help="Report sizes without writing")
+
+    def handle(self, *args, **opts):
+        done = 0
+        before = after = 0
+        kept = 0
+        last_id = None
+        while not opts["limit"] or done < opts["limit"]:
+            with transaction.atomic():
+                qs = (
+                    DetectionJob.objects.select_for_update(skip_locked=True)
+                    .filter(status="DONE", result__isnull=False, result_blob__isnull=True)
+                    .order_by("id")
+                )
+                if last_id is not None:  # page by id so skipped (and dry-run) rows are not rescanned
+                    qs = qs.filter(id__gt=last_id)
+                size = opts["batch_size"] if not opts["limit"] else min(opts["batch_size"], opts["limit"] - done)
+                batch = list(qs[:size])
+                if not batch:
+                    break
+                for job in batch:
+                    payload = job.result_data()
+                    if not isinstance(payload, dict) or not payload.get("success", True):
+                        continue
+                    job.set_result(payload)
+                    errors = roundtrip_errors(payload, job.result_blob)
+                    if errors:
+                        kept += 1
+                        self.stdout.write(self.style.WARNING(f"  job {job.id} kept as JSON: " + "; ".join(errors)))
+                        continue
+                    before += len(json.dumps(payload).encode("utf-8"))
+                    after += len(job.result_blob)
+                    if not opts["dry_run"]:
+                        job.save(update_fields=["result", "result_blob"])
+                last_id = batch[-1].id
+            done += len(batch)
+            self.stdout.write(f"  {done} jobs scanned")
+
+        ratio = f" ({after / before:.1%} of original)" if before else ""
+        verb = "Would compact" if opts["dry_run"] else "Compacted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {done - kept} jobs: {before} -> {after} bytes{ratio}"))
+        if kept:
+            self.stdout.write(self.style.WARNING(f"{kept} jobs kept as JSON (would not round-trip)"))
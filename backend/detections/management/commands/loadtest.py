@@ -0,0 +1,331 @@
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+OPS = ("basic", "large", "jobs", "download")
+
+# Environment for --local: stub engine, throwaway SQLite + media, tasks run inline
+LOCAL_ENV = {
+    "DETECTION_ENGINE": "stub",
+    "DB_ENGINE": "sqlite",
+    "CELERY_TASK_ALWAYS_EAGER": "1",
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "DEBUG": "0",
+}
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, math.ceil(pct / 100.0 * len(sorted_vals)) - 1))  # nearest rank
+    return sorted_vals[k]
+
+
+def _parse_mix(raw):
+    mix = {}
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise CommandError(f"Unknown op '{name}' in --mix (valid: {', '.join(OPS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise CommandError("--mix needs at least one op with positive weight")
+    return mix
+
+
+def _synthetic_jpeg(width, height):
+    from PIL import Image, ImageDraw
+
+    im = Image.new("RGB", (width, height), (60, 90, 40))
+    draw = ImageDraw.Draw(im)
+    rng = random.Random(0)
+    for _ in range(200):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.ellipse((x, y, x + 25, y + 12), fill=(200, 180, 90))
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (fname, data, ctype) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{fname}"\r\n'
+            f"Content-Type: {ctype}\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class _Client:
+    """One request per op; returns (ok, status)."""
+
+    def __init__(self, base_url, image, model, clients, timeout):
+        self.base = base_url.rstrip("/")
+        self.image = image
+        self.model = model
+        self.clients = [f"load-{i}" for i in range(max(clients, 1))]
+        self.timeout = timeout
+        self.done_ids = deque(maxlen=1000)   # finished jobs seen in /jobs/; only these have labels
+
+    def _request(self, method, path, body=None, headers=None):
+        req = urllib.request.Request(self.base + path, data=body, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, socket.timeout, ConnectionError):
+            return 0, b""
+
+    def basic(self):
+        body, ctype = _multipart(
+            {"model": self.model, "conf": "0.05"}, {"image": ("load.jpg", self.image, "image/jpeg")}
+        )
+        return self._request("POST", "/api/detect/basic/", body, {"Content-Type": ctype})
+
+    def large(self):
+        body, ctype = _multipart({"confidence": "0.25"}, {"image": ("load.jpg", self.image, "image/jpeg")})
+        status, data = self._request(
+            "POST", "/api/detect/large/", body,
+            {"Content-Type": ctype, "X-Client-Id": random.choice(self.clients)},
+        )
+        return status, data
+
+    def jobs(self):
+        status, data = self._request("GET", "/api/jobs/")
+        if status == 200:
+            try:
+                rows = json.loads(data)
+                rows = rows.get("results", []) if isinstance(rows, dict) else rows
+                self.done_ids.extend(r["id"] for r in rows if r.get("status") == "DONE")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                pass
+        return status, data
+
+    def download(self):
+        return self._request("GET", f"/api/download/{random.choice(self.done_ids)}.txt")
+
+    def queue_depth(self):
+        status, data = self._request("GET", "/api/queue/")
+        if status != 200:
+            return None
+        q = json.loads(data)
+        return q.get("QUEUED", 0) + q.get("PENDING", 0) + q.get("PROCESSING", 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a mix of detect/basic, detect/large, jobs and download calls against a server, "
+        "ramping concurrency step by step until throughput stops growing, p95 latency exceeds "
+        "the SLO or errors pile up. With --local, starts a throwaway stack (stub engine, SQLite, "
+        "eager Celery) first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--local", action="store_true", help="Start a local stub-engine server for the run")
+        parser.add_argument("--server", choices=["runserver", "gunicorn"], default="runserver",
+                            help="Server for --local (gunicorn is closer to production)")
+        parser.add_argument("--gunicorn-workers", type=int, default=2)
+        parser.add_argument("--gunicorn-threads", type=int, default=4)
+        parser.add_argument("--mix", default="basic=5,large=2,jobs=2,download=1",
+                            help="Weighted op mix, e.g. 'basic=5,large=2,jobs=2,download=1'")
+        parser.add_argument("--model", default="spike", help="Model key for detect/basic")
+        parser.add_argument("--image", help="Image file to upload (default: synthetic JPEG)")
+        parser.add_argument("--image-size", default="1280x960", help="Synthetic image WxH")
+        parser.add_argument("--clients", type=int, default=4, help="Distinct X-Client-Id values for detect/large")
+        parser.add_argument("--start-concurrency", type=int, default=1)
+        parser.add_argument("--max-concurrency", type=int, default=64)
+        parser.add_argument("--step-factor", type=float, default=2.0, help="Concurrency multiplier per step")
+        parser.add_argument("--step-seconds", type=float, default=20.0)
+        parser.add_argument("--slo-p95-ms", type=float, default=2000.0)
+        parser.add_argument("--max-error-rate", type=float, default=0.05)
+        parser.add_argument("--min-gain", type=float, default=0.05,
+                            help="Throughput growth per step below which the service is saturated")
+        parser.add_argument("--no-stop", action="store_true", help="Keep ramping after saturation is found")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (s)")
+        parser.add_argument("--output", help="Write the full report (steps + queue timeline) as JSON")
+
+    # ---------- local stack ----------
+    def _start_local(self, opts):
+        tmp = tempfile.mkdtemp(prefix="loadtest-")
+        env = {**os.environ, **LOCAL_ENV,
+               "SQLITE_PATH": os.path.join(tmp, "db.sqlite3"), "MEDIA_ROOT": os.path.join(tmp, "media")}
+        manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+        subprocess.run(manage + ["migrate", "--noinput", "-v", "0"], env=env, check=True, cwd=str(settings.BASE_DIR))
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        if opts["server"] == "gunicorn":
+            cmd = [sys.executable, "-m", "gunicorn", "server.wsgi", "-b", f"127.0.0.1:{port}",
+                   "-w", str(opts["gunicorn_workers"]), "--threads", str(opts["gunicorn_threads"])]
+        else:
+            cmd = manage + ["runserver", f"127.0.0.1:{port}", "--noreload"]
+        proc = subprocess.Popen(cmd, env=env, cwd=str(settings.BASE_DIR),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if proc.poll() is not None:
+                raise CommandError(f"Local server exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(base + "/api/health/live/", timeout=2):
+                    break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.5)
+        else:
+            proc.terminate()
+            raise CommandError("Local server did not come up within 60s")
+        self.stdout.write(f"Local stack ({opts['server']}, stub engine, SQLite) at {base}; data in {tmp}")
+        return proc, base
+
+    # ---------- load ----------
+    def _run_step(self, client, mix, concurrency, seconds, timeline, t0):
+        ops, weights = list(mix), list(mix.values())
+        samples = []
+        stop = threading.Event()
+
+        def worker():
+            rng = random.Random()
+            while not stop.is_set():
+                op = rng.choices(ops, weights)[0]
+                if op == "download" and not client.done_ids:
+                    op = "jobs"  # nothing finished to download yet; listing jobs finds some
+                start = time.perf_counter()
+                status, _ = getattr(client, op)()
+                samples.append((op, time.perf_counter() - start, 200 <= status < 400))
+
+        def sampler():
+            while not stop.is_set():
+                depth = client.queue_depth()
+                timeline.append({"t": round(time.time() - t0, 2), "concurrency": concurrency, "queue_depth": depth})
+                stop.wait(1.0)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        threads.append(threading.Thread(target=sampler, daemon=True))
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        return self._summarize(samples, elapsed, concurrency, [p for p in timeline if p["concurrency"] == concurrency])
+
+    def _summarize(self, samples, elapsed, concurrency, points):
+        def stats(rows):
+            lat = sorted(r[1] * 1000 for r in rows)
+            ok = sum(1 for r in rows if r[2])
+            return {
+                "requests": len(rows),
+                "ok": ok,
+                "throughput_rps": round(ok / elapsed, 2),
+                "error_rate": round(1 - ok / len(rows), 4) if rows else 0.0,
+                "p50_ms": round(_percentile(lat, 50), 1) if lat else None,
+                "p95_ms": round(_percentile(lat, 95), 1) if lat else None,
+                "p99_ms": round(_percentile(lat, 99), 1) if lat else None,
+            }
+
+        depths = [p["queue_depth"] for p in points if p["queue_depth"] is not None]
+        return {
+            "concurrency": concurrency,
+            **stats(samples),
+            "per_op": {op: stats([s for s in samples if s[0] == op]) for op in sorted({s[0] for s in samples})},
+            "queue_depth_max": max(depths) if depths else None,
+            "queue_depth_last": depths[-1] if depths else None,
+        }
+
+    def handle(self, *args, **opts):
+        mix = _parse_mix(opts["mix"])
+        if opts["image"]:
+            with open(opts["image"], "rb") as f:
+                image = f.read()
+        else:
+            w, _, h = opts["image_size"].partition("x")
+            image = _synthetic_jpeg(int(w), int(h))
+
+        proc = None
+        base = opts["base_url"]
+        if opts["local"]:
+            proc, base = self._start_local(opts)
+        try:
+            report = self._ramp(_Client(base, image, opts["model"], opts["clients"], opts["timeout"]), mix, opts)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {opts['output']}")
+
+    def _ramp(self, client, mix, opts):
+        self.stdout.write(f"{'conc':>5}{'req/s':>9}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queue':>7}")
+        steps, timeline = [], []
+        t0 = time.time()
+        best = None
+        saturation = None
+        c = max(opts["start_concurrency"], 1)
+        while c <= opts["max_concurrency"]:
+            step = self._run_step(client, mix, c, opts["step_seconds"], timeline, t0)
+            steps.append(step)
+            self.stdout.write(
+                f"{c:>5}{step['throughput_rps']:>9.2f}{step['error_rate'] * 100:>7.1f}"
+                f"{step['p50_ms'] or 0:>9.1f}{step['p95_ms'] or 0:>9.1f}{step['p99_ms'] or 0:>9.1f}"
+                f"{step['queue_depth_max'] if step['queue_depth_max'] is not None else '-':>7}"
+            )
+
+            reason = None
+            if step["error_rate"] > opts["max_error_rate"]:
+                reason = f"error rate {step['error_rate']:.1%} > {opts['max_error_rate']:.1%}"
+            elif step["p95_ms"] is not None and step["p95_ms"] > opts["slo_p95_ms"]:
+                reason = f"p95 {step['p95_ms']:.0f} ms > SLO {opts['slo_p95_ms']:.0f} ms"
+            elif best is not None and step["throughput_rps"] < best["throughput_rps"] * (1 + opts["min_gain"]):
+                reason = f"throughput gain < {opts['min_gain']:.0%}"
+            if reason and saturation is None:
+                saturation = {
+                    "concurrency": best["concurrency"] if best else c,
+                    "throughput_rps": best["throughput_rps"] if best else step["throughput_rps"],
+                    "reason": f"at concurrency {c}: {reason}",
+                }
+                if not opts["no_stop"]:
+                    break
+            if best is None or step["throughput_rps"] > best["throughput_rps"]:
+                best = step
+            c = max(c + 1, int(c * opts["step_factor"]))
+
+        if saturation:
+            self.stdout.write(self.style.WARNING(
+                f"Saturation: ~{saturation['throughput_rps']} req/s at concurrency "
+                f"{saturation['concurrency']} ({saturation['reason']})"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("No saturation found up to --max-concurrency"))
+        return {"mix": mix, "steps": steps, "saturation": saturation, "queue_timeline": timeline}
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from detections import analytics
+from detections.models import AggregateCounter, DetectionJob, JobSummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute job summaries and day/tag counters from finished jobs. "
+        "Normally unnecessary: tasks update them as jobs finish. Only counters for days/tags "
+        "that still have jobs are reset; keys whose jobs were all purged by retention keep "
+        "their totals, but a partly purged key (the oldest retained day, a tag spanning "
+        "purged days) is rebuilt from its surviving jobs only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--missing-only", action="store_true", help="Only add jobs without a summary; keep counters")
+
+    def _reset_affected(self) -> int:
+        """Drop summaries and the counters of every day/tag that surviving jobs contribute to."""
+        days, tags = set(), set()
+        for created_at, tag in DetectionJob.objects.filter(status="DONE").values_list("created_at", "tag").iterator():
+            days.add(created_at.date().isoformat())  # same key as analytics.summarize
+            if tag:
+                tags.add(tag)
+        affected = (
+            Q(scope=AggregateCounter.SCOPE_DAY, key__in=days) | Q(scope=AggregateCounter.SCOPE_TAG, key__in=tags)
+        )
+        with transaction.atomic():
+            n, _ = AggregateCounter.objects.filter(affected).delete()
+            JobSummary.objects.all().delete()   # summaries only exist for surviving jobs
+        kept = AggregateCounter.objects.count()
+        if kept:
+            self.stdout.write(f"  kept {kept} counter rows for days/tags with no remaining jobs")
+        return n
+
+    def handle(self, *args, **opts):
+        if not opts["missing_only"]:
+            self._reset_affected()
+
+        qs = DetectionJob.objects.filter(status="DONE", summary__isnull=True).order_by("id")
+        done = 0
+        last_id = None
+        while True:
+            page = qs.filter(id__gt=last_id) if last_id is not None else qs
+            batch = list(page[: opts["batch_size"]])
+            if not batch:
+                break
+            for job in batch:
+                payload = job.result_data()
+                if isinstance(payload, dict) and payload.get("success", True):
+                    analytics.record_job(job, payload)
+                    done += 1
+            last_id = batch[-1].id
+            self.stdout.write(f"  {done} jobs recorded")
+        self.stdout.write(self.style.SUCCESS(f"Recorded {done} jobs"))
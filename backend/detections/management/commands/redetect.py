@@ -0,0 +1,136 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detections.engine import get_engine
+from detections.models import DetectionJob
+from detections.tasks import redetect_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run finished jobs whose model_version no longer matches the current weights, "
+        "in batches spread over the workers (bulk queue). Every finished job is stamped with "
+        "the new version, so an interrupted run picks up where it stopped. Reports how "
+        "detection counts changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", help="Only these model keys (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=25, help="Jobs per task")
+        parser.add_argument("--parallel", type=int, default=4, help="Batches in flight at once")
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many stale jobs (0 = all)")
+        parser.add_argument("--queue", default=settings.DETECTION_QUEUES[DetectionJob.PRIORITY_BULK])
+        parser.add_argument("--inline", action="store_true", help="Process batches in this process instead of workers")
+        parser.add_argument("--dry-run", action="store_true", help="Only count stale jobs per model")
+        parser.add_argument("--show", type=int, default=10, help="List the N jobs whose counts changed most")
+        parser.add_argument("--report", help="Write per-job before/after class counts as JSON")
+
+    def _stale(self, opts):
+        """{model: (current version, queryset of stale job ids)} for models whose weights exist."""
+        engine = get_engine()
+        done = DetectionJob.objects.filter(status="DONE")
+        names = opts["model"] or sorted(set(done.values_list("model_name", flat=True)))
+        out = {}
+        for name in names:
+            version = engine.model_version(name)
+            if not version:
+                self.stdout.write(self.style.WARNING(f"{name}: no weights available, skipped"))
+                continue
+            qs = done.filter(model_name=name).exclude(model_version=version).order_by("id")
+            out[name] = (version, qs.values_list("id", flat=True))
+        return out
+
+    def _batches(self, stale, opts):
+        sent = 0
+        for version, ids in stale.values():
+            last_id = None
+            while not opts["limit"] or sent < opts["limit"]:
+                page = ids.filter(id__gt=last_id) if last_id is not None else ids
+                size = opts["batch_size"] if not opts["limit"] else min(opts["batch_size"], opts["limit"] - sent)
+                batch = [str(i) for i in page[:size]]
+                if not batch:
+                    break
+                last_id = batch[-1]
+                sent += len(batch)
+                yield batch
+
+    def handle(self, *args, **opts):
+        stale = self._stale(opts)
+        for name, (version, ids) in stale.items():
+            self.stdout.write(f"{name}: current weights {version}, {ids.count()} stale jobs")
+        if opts["dry_run"]:
+            return
+
+        totals = {"redetected": 0, "reused": 0, "skipped": 0, "failed": 0}
+        jobs = []
+
+        def collect(result):
+            for k in totals:
+                totals[k] += result[k]
+            jobs.extend(result["jobs"])
+            self.stdout.write(
+                f"  {totals['redetected']} redetected, {totals['reused']} reused, "
+                f"{totals['skipped']} skipped, {totals['failed']} failed"
+            )
+
+        batches = self._batches(stale, opts)
+        if opts["inline"]:
+            for batch in batches:
+                collect(redetect_jobs(batch))
+        else:
+            pending = []
+            for batch in batches:
+                pending.append(redetect_jobs.apply_async(args=[batch], queue=opts["queue"]))
+                while len(pending) >= opts["parallel"]:
+                    pending = self._drain(pending, collect)
+            while pending:
+                pending = self._drain(pending, collect)
+
+        self._report(totals, jobs, opts)
+
+    def _drain(self, pending, collect):
+        """Collect finished batches; wait a little if none is done yet."""
+        still = []
+        for res in pending:
+            if res.ready():
+                collect(res.get(propagate=True))
+            else:
+                still.append(res)
+        if len(still) == len(pending):
+            time.sleep(0.5)
+        return still
+
+    def _report(self, totals, jobs, opts):
+        old_total = sum(sum(j["old"].values()) for j in jobs)
+        new_total = sum(sum(j["new"].values()) for j in jobs)
+        per_class = {}
+        for j in jobs:
+            for cls in set(j["old"]) | set(j["new"]):
+                o, n = per_class.get((j["model"], cls), (0, 0))
+                per_class[(j["model"], cls)] = (o + j["old"].get(cls, 0), n + j["new"].get(cls, 0))
+
+        changed = [j for j in jobs if j["old"] != j["new"]]
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {totals['redetected'] + totals['reused']} jobs "
+            f"({totals['redetected']} redetected, {totals['reused']} reused by image hash); "
+            f"{totals['skipped']} already current, {totals['failed']} failed"
+        ))
+        pct = f" ({(new_total - old_total) / old_total:+.1%})" if old_total else ""
+        self.stdout.write(f"Detections: {old_total} -> {new_total}, {new_total - old_total:+d}{pct}; "
+                          f"{len(changed)} jobs changed")
+        for (model, cls), (o, n) in sorted(per_class.items()):
+            self.stdout.write(f"  {model}/{cls or '-'}: {o} -> {n} ({n - o:+d})")
+
+        def delta(j):
+            return sum(j["new"].values()) - sum(j["old"].values())
+
+        for j in sorted(changed, key=lambda j: abs(delta(j)), reverse=True)[: opts["show"]]:
+            self.stdout.write(f"  job {j['id']}: {sum(j['old'].values())} -> {sum(j['new'].values())} ({delta(j):+d})")
+
+        if opts["report"]:
+            with open(opts["report"], "w", encoding="utf-8") as f:
+                json.dump({"totals": totals, "old_detections": old_total, "new_detections": new_total, "jobs": jobs}, f, indent=2)
+            self.stdout.write(f"Report written to {opts['report']}")
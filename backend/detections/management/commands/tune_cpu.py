@@ -0,0 +1,83 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from detections import cputune
+from detections.engine import get_engine
+
+
+def _registered_weights() -> dict:
+    """Model key -> weights path for every registered model whose file exists."""
+    return {k: p for k, p in get_engine().available_models().items() if os.path.exists(p)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark predict for each registered model under different "
+        "(worker processes x threads per process) layouts on this machine, "
+        "and write the fastest to CPU_TUNING_FILE for workers and load_model to apply."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--models", nargs="*", help="Model keys to benchmark (default: all with weights present)")
+        parser.add_argument("--imgsz", type=int, default=640, help="Synthetic input size")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Measured run time per layout")
+        parser.add_argument("--output", default=settings.CPU_TUNING_FILE)
+        parser.add_argument("--dry-run", action="store_true", help="Print the result without writing it")
+
+    def handle(self, *args, **opts):
+        weights = _registered_weights()
+        if opts["models"]:
+            missing = set(opts["models"]) - set(weights)
+            if missing:
+                raise CommandError(f"No weights found for: {sorted(missing)}")
+            weights = {k: weights[k] for k in opts["models"]}
+        if not weights:
+            raise CommandError("No model weights found; nothing to benchmark.")
+
+        cores = cputune.cpu_count()
+        layouts = cputune.candidate_layouts(cores)
+        self.stdout.write(f"{cores} CPUs, {len(layouts)} layouts, models: {', '.join(weights)}")
+
+        results = []
+        for layout in layouts:
+            p, t = layout["processes"], layout["intra_op_threads"]
+            per_model = {}
+            for key, path in weights.items():
+                per_model[key] = cputune.benchmark(path, p, t, imgsz=opts["imgsz"], seconds=opts["seconds"])
+                self.stdout.write(
+                    f"  {p:>2} proc x {t:>2} thr  {key:<10} "
+                    f"{per_model[key]['images_per_s']:>8.2f} img/s  {per_model[key]['latency_s'] * 1000:>8.1f} ms"
+                )
+            results.append({**layout, "models": per_model})
+
+        # Score each layout by its throughput relative to the best layout for each
+        # model, so a fast small model does not drown out a slow large one.
+        best_per_model = {k: max(r["models"][k]["images_per_s"] for r in results) or 1.0 for k in weights}
+        for r in results:
+            r["score"] = round(
+                sum(r["models"][k]["images_per_s"] / best_per_model[k] for k in weights) / len(weights), 4
+            )
+        best = max(results, key=lambda r: (r["score"], -r["processes"]))
+
+        config = {
+            "processes": best["processes"],
+            "intra_op_threads": best["intra_op_threads"],
+            "inter_op_threads": 1,
+            "cpu_count": cores,
+            "imgsz": opts["imgsz"],
+            "created_at": timezone.now().isoformat(),
+            "benchmarks": results,
+        }
+        self.stdout.write(self.style.SUCCESS(
+            f"Best: {best['processes']} processes x {best['intra_op_threads']} threads (score {best['score']})"
+        ))
+        if opts["dry_run"]:
+            self.stdout.write(json.dumps(config, indent=2))
+            return
+        with open(opts["output"], "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+        self.stdout.write(f"Wrote {opts['output']}; restart workers to apply.")
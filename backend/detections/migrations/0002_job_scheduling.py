@@ -0,0 +1,57 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='client_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='model_name',
+            field=models.CharField(default='obb', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='pixels',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'High'), (1, 'Normal'), (2, 'Bulk')], default=1),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='queue',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='detectionjob',
+            name='status',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='detectionjob',
+            index=models.Index(fields=['status', 'priority', 'created_at'], name='job_dispatch_idx'),
+        ),
+    ]
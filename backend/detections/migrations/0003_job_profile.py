@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0002_job_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='profile',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0003_job_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='rois',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
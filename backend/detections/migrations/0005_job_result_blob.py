@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0004_job_rois'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='result_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
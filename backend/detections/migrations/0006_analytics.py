@@ -0,0 +1,56 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0005_job_result_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSummary',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='detections.detectionjob')),
+                ('model_name', models.CharField(max_length=32)),
+                ('tag', models.CharField(blank=True, default='', max_length=64)),
+                ('day', models.DateField()),
+                ('detection_count', models.IntegerField(default=0)),
+                ('megapixels', models.FloatField(default=0.0)),
+                ('density_per_mp', models.FloatField(default=0.0)),
+                ('class_counts', models.JSONField(default=dict)),
+                ('conf_hist', models.JSONField(default=list)),
+                ('class_conf_hist', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='tag',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='AggregateCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('day', 'Day'), ('tag', 'Tag')], max_length=8)),
+                ('key', models.CharField(max_length=64)),
+                ('model_name', models.CharField(max_length=32)),
+                ('class_name', models.CharField(blank=True, default='', max_length=64)),
+                ('job_count', models.IntegerField(default=0)),
+                ('positive_job_count', models.IntegerField(default=0)),
+                ('detection_count', models.BigIntegerField(default=0)),
+                ('megapixels', models.FloatField(default=0.0)),
+                ('conf_hist', models.JSONField(default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'model_name', 'class_name', 'key'], name='aggregate_lookup_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='aggregatecounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'key', 'model_name', 'class_name'), name='aggregate_counter_uniq'),
+        ),
+    ]
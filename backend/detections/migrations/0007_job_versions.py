@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0006_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='model_version',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=16),
+        ),
+    ]
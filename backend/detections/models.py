@@ -1,22 +1,115 @@
+import json
 import uuid
 from django.db import models
 
+from .results import pack, unpack
+
 class DetectionJob(models.Model):
     STATUS_CHOICES = [
+        ("QUEUED", "Queued"),
         ("PENDING", "Pending"),
         ("PROCESSING", "Processing"),
         ("DONE", "Done"),
         ("FAILED", "Failed"),
     ]
 
+    # Lower value = dispatched first (see detections/scheduling.py)
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_BULK = 2
+    PRIORITY_CHOICES = [
+        (PRIORITY_HIGH, "High"),
+        (PRIORITY_NORMAL, "Normal"),
+        (PRIORITY_BULK, "Bulk"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     image = models.ImageField(upload_to="uploads/")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
     progress = models.IntegerField(default=0)
     confidence = models.FloatField(default=0.25)
     result = models.JSONField(null=True, blank=True)
+    # Finished payloads, zstd-packed (detections/results.py); `result` then stays empty
+    result_blob = models.BinaryField(null=True, blank=True, editable=False)
     labels_file = models.CharField(max_length=255, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Scheduling
+    client_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    model_name = models.CharField(max_length=32, default="obb")
+    # Weights that produced `result` and the upload's content hash (see detections/versions.py)
+    model_version = models.CharField(max_length=16, blank=True, default="", db_index=True)
+    image_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # Inference profile name (detections/profiles.py); blank = the model's default
+    profile = models.CharField(max_length=16, blank=True, default="")
+    # Free-form grouping label (e.g. trial id) for analytics rollups
+    tag = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # Optional ROI polygons (flat [x1,y1,...] lists); only these regions are inferred
+    rois = models.JSONField(null=True, blank=True)
+    pixels = models.BigIntegerField(default=0)
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_NORMAL)
+    queue = models.CharField(max_length=32, blank=True, default="")
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "priority", "created_at"], name="job_dispatch_idx"),
+        ]
+
     def __str__(self):
         return f"{self.id} - {self.status}"
+
+    def result_data(self):
+        """Decoded result payload, whether packed or stored as (legacy) JSON."""
+        if self.result_blob:
+            return unpack(self.result_blob)
+        if isinstance(self.result, str):
+            return json.loads(self.result)
+        return self.result
+
+    def set_result(self, payload):
+        """Store `payload` packed; callers save both `result` and `result_blob`."""
+        self.result_blob = pack(payload)
+        self.result = None
+
+
+class JobSummary(models.Model):
+    """Per-job statistics, computed once when the job finishes (see detections/analytics.py)."""
+    job = models.OneToOneField(DetectionJob, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    model_name = models.CharField(max_length=32)
+    tag = models.CharField(max_length=64, blank=True, default="")
+    day = models.DateField()
+    detection_count = models.IntegerField(default=0)
+    megapixels = models.FloatField(default=0.0)
+    density_per_mp = models.FloatField(default=0.0)
+    class_counts = models.JSONField(default=dict)
+    conf_hist = models.JSONField(default=list)
+    class_conf_hist = models.JSONField(default=dict)
+
+
+class AggregateCounter(models.Model):
+    """
+    Running totals per (scope, key, model, class), updated incrementally from JobSummary.
+    class_name "" is the all-classes row; it alone carries job_count and megapixels.
+    """
+    SCOPE_DAY = "day"
+    SCOPE_TAG = "tag"
+    SCOPE_CHOICES = [(SCOPE_DAY, "Day"), (SCOPE_TAG, "Tag")]
+
+    scope = models.CharField(max_length=8, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=64)
+    model_name = models.CharField(max_length=32)
+    class_name = models.CharField(max_length=64, blank=True, default="")
+    job_count = models.IntegerField(default=0)
+    positive_job_count = models.IntegerField(default=0)
+    detection_count = models.BigIntegerField(default=0)
+    megapixels = models.FloatField(default=0.0)
+    conf_hist = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key", "model_name", "class_name"], name="aggregate_counter_uniq"),
+        ]
+        indexes = [models.Index(fields=["scope", "model_name", "class_name", "key"], name="aggregate_lookup_idx")]
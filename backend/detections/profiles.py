@@ -0,0 +1,181 @@
+# detections/profiles.py
+"""
+Named speed/accuracy profiles for `predict`.
+
+A profile fixes the inference input size and `max_det`. The input is always
+letterboxed rectangularly (padded only to the image's aspect ratio): that is
+what Ultralytics does for a single image anyway, and passing the stride-aligned
+(h, w) explicitly keeps ROI crop batches, which it would pad square, the same. Profiles are chosen per request or per model (MODEL_PROFILES in
+detect_models.py); "auto" picks the size from a quick low-resolution probe.
+
+Every predict call is timed and accumulated per (profile, model) so the
+sizes can be tuned on CPU nodes: see `profile_stats()` / GET /api/profiles/.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STRIDE = 32                # YOLO input sizes must be multiples of the max stride
+AUTO = "auto"
+PROBE_IMGSZ = 320          # auto: first-pass size
+PROBE_CONF = 0.10
+AUTO_MIN_IMGSZ = 640
+AUTO_MAX_IMGSZ = 1536
+AUTO_TARGET_OBJECT_PX = 24  # auto: smallest typical object should be ~this many input pixels
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    name: str
+    imgsz: int
+    max_det: int
+    # Never upsample past the image's own resolution; that only costs time.
+    # Off for the default profile so it keeps Ultralytics' behaviour exactly.
+    clamp: bool = True
+
+    def predict_kwargs(self, width: int, height: int) -> Dict[str, Any]:
+        """Ultralytics `predict` kwargs for an image of the given size."""
+        longest = max(width, height, 1)
+        size = min(self.imgsz, _round_up(longest)) if self.clamp else self.imgsz
+        if width and height:
+            scale = size / longest
+            imgsz: Any = (_round_up(height * scale), _round_up(width * scale))
+        else:
+            imgsz = size
+        return {"imgsz": imgsz, "max_det": self.max_det}
+
+
+PROFILES: Dict[str, InferenceProfile] = {
+    "fast":     InferenceProfile("fast",     imgsz=640,  max_det=300, clamp=False),
+    "balanced": InferenceProfile("balanced", imgsz=1024, max_det=1000),
+    "accurate": InferenceProfile("accurate", imgsz=1536, max_det=3000),
+}
+PROFILE_NAMES = list(PROFILES) + [AUTO]
+# Matches Ultralytics predict defaults (640, minimal-padding letterbox, 300 dets, small images upscaled)
+DEFAULT_PROFILE = "fast"
+
+
+def _round_up(v: float) -> int:
+    return max(STRIDE, int(math.ceil(v / STRIDE)) * STRIDE)
+
+
+def get_profile(name: Optional[str]) -> Optional[InferenceProfile]:
+    """Return the named profile, or None for "auto" (resolved per image)."""
+    name = (name or DEFAULT_PROFILE).strip().lower()
+    if name == AUTO:
+        return None
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile '{name}'. Valid: {PROFILE_NAMES}")
+    return PROFILES[name]
+
+
+# ---------- auto mode ----------
+def _object_sizes(result: Any) -> np.ndarray:
+    """Per-detection characteristic size (sqrt of box area) in original-image pixels."""
+    obb = getattr(result, "obb", None)
+    if obb is not None and getattr(obb, "xywhr", None) is not None:
+        wh = obb.xywhr[:, 2:4]
+    else:
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or getattr(boxes, "xywh", None) is None:
+            return np.zeros(0)
+        wh = boxes.xywh[:, 2:4]
+    wh = wh.cpu().numpy() if hasattr(wh, "cpu") else np.asarray(wh)
+    return np.sqrt(np.clip(wh[:, 0] * wh[:, 1], 0, None)) if len(wh) else np.zeros(0)
+
+
+def auto_profile(model: Any, source: Any, width: int, height: int) -> InferenceProfile:
+    """
+    Low-resolution probe, then size the real pass so the smaller objects found
+    land around AUTO_TARGET_OBJECT_PX input pixels. Dense images also get a
+    higher max_det. `source` may be a list of crops (one batch).
+    """
+    results = model.predict(source, imgsz=PROBE_IMGSZ, conf=PROBE_CONF, max_det=3000, verbose=False)
+    # A batch of ROI crops is probed as-is; width/height are then the largest crop's
+    sizes = np.concatenate([_object_sizes(r) for r in results]) if len(results) else np.zeros(0)
+    longest = max(width, height, 1)
+
+    if sizes.size == 0:
+        return InferenceProfile(AUTO, imgsz=AUTO_MIN_IMGSZ, max_det=300)
+
+    small = float(np.percentile(sizes, 25))
+    imgsz = longest * AUTO_TARGET_OBJECT_PX / max(small, 1.0)
+    imgsz = int(min(max(imgsz, AUTO_MIN_IMGSZ), AUTO_MAX_IMGSZ))
+    # The probe misses small objects, so scale its count by the area ratio.
+    expected = sizes.size / max(len(results), 1) * (imgsz / PROBE_IMGSZ) ** 2
+    max_det = int(min(max(expected * 1.5, 300), 10000))
+    return InferenceProfile(AUTO, imgsz=_round_up(imgsz), max_det=max_det)
+
+
+def resolve(name: Optional[str], model: Any, source: Any, width: int, height: int) -> InferenceProfile:
+    profile = get_profile(name)
+    return profile if profile is not None else auto_profile(model, source, width, height)
+
+
+def skipped(name: Optional[str]) -> Dict[str, Any]:
+    """Response `profile` entry when nothing was inferred (e.g. every ROI outside the image)."""
+    return {"name": (name or DEFAULT_PROFILE).strip().lower(), "imgsz": None, "max_det": None}
+
+
+# ---------- throughput / latency stats ----------
+_stats_lock = threading.Lock()
+_stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+
+def record(profile: str, model_name: str, pixels: int, seconds: float) -> None:
+    with _stats_lock:
+        s = _stats.setdefault((profile, model_name), {"calls": 0, "seconds": 0.0, "pixels": 0, "max_seconds": 0.0})
+        s["calls"] += 1
+        s["seconds"] += seconds
+        s["pixels"] += pixels
+        s["max_seconds"] = max(s["max_seconds"], seconds)
+    logger.info(
+        "predict profile=%s model=%s pixels=%d latency=%.3fs throughput=%.2fMP/s",
+        profile, model_name, pixels, seconds, (pixels / 1e6) / seconds if seconds else 0.0,
+    )
+
+
+class timed:
+    """Context manager: `with timed(profile, model_name, pixels): model.predict(...)`."""
+
+    def __init__(self, profile: str, model_name: str, pixels: int):
+        self.profile, self.model_name, self.pixels = profile, model_name, pixels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            record(self.profile, self.model_name, self.pixels, time.perf_counter() - self.t0)
+        return False
+
+
+def profile_stats() -> list[Dict[str, Any]]:
+    """Snapshot of this process's per-(profile, model) latency and throughput."""
+    with _stats_lock:
+        items = [(k, dict(v)) for k, v in _stats.items()]
+    out = []
+    for (profile, model_name), s in sorted(items):
+        out.append({
+            "profile": profile,
+            "model": model_name,
+            "calls": int(s["calls"]),
+            "mean_latency_s": round(s["seconds"] / s["calls"], 4) if s["calls"] else None,
+            "max_latency_s": round(s["max_seconds"], 4),
+            "megapixels_per_s": round((s["pixels"] / 1e6) / s["seconds"], 3) if s["seconds"] else None,
+        })
+    return out
+
+
+def describe() -> list[Dict[str, Any]]:
+    return [asdict(p) for p in PROFILES.values()]
@@ -0,0 +1,142 @@
+# detections/results.py
+"""
+Compact storage for DetectionJob results.
+
+A finished job's payload is stored in `DetectionJob.result_blob` as
+zstd-compressed columnar arrays instead of a JSON document, which keeps
+dense jobs to a fraction of their JSON size and out of TOAST-heavy queries.
+
+Blob layout (little-endian):
+
+    b"YDR1" | zstd( u32 header_len | header JSON | arrays... )
+
+The header carries every scalar payload field plus the class-name table and
+array lengths; arrays are class index (u16), class id (i32, -1 = none),
+confidence (f32) and polygons (f32, N x 8). Detections whose keys do not fit
+that shape are stored as compressed JSON instead (magic b"YDJ1").
+Floats are stored as f32, so the columnar encoding is lossy: decoding rounds
+polygons to POLY_DIGITS decimals and confidences to CONF_DIGITS. Task results
+are rounded to the same precision before they are packed, so they decode
+unchanged; `roundtrip_errors` checks a payload against its decoded blob.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+import zstandard
+
+MAGIC_COLUMNAR = b"YDR1"
+MAGIC_JSON = b"YDJ1"
+ZSTD_LEVEL = 9
+POLY_DIGITS = 2
+CONF_DIGITS = 6
+_COLUMNS = {"class", "class_id", "confidence"}
+
+
+def _poly_key(detections: List[Dict[str, Any]]) -> str | None:
+    """Name of the polygon key if every detection is {class, class_id, confidence, <poly of 8>}."""
+    if not detections:
+        return "polygon"
+    key = "polygon" if "polygon" in detections[0] else "poly" if "poly" in detections[0] else None
+    if key is None:
+        return None
+    expected = _COLUMNS | {key}
+    for d in detections:
+        if set(d) != expected or len(d[key]) != 8:
+            return None
+    return key
+
+
+def pack(payload: Dict[str, Any]) -> bytes:
+    detections = payload.get("detections") or []
+    key = _poly_key(detections)
+    cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    if key is None:
+        return MAGIC_JSON + cctx.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    names: Dict[str, int] = {}
+    cls_idx = np.array([names.setdefault(str(d["class"]), len(names)) for d in detections], dtype="<u2")
+    cls_id = np.array([-1 if d["class_id"] is None else int(d["class_id"]) for d in detections], dtype="<i4")
+    conf = np.array([float(d["confidence"]) for d in detections], dtype="<f4")
+    polys = np.array([d[key] for d in detections], dtype="<f4").reshape(-1, 8)
+
+    header = {k: v for k, v in payload.items() if k != "detections"}
+    header["_n"] = len(detections)
+    header["_classes"] = list(names)
+    header["_poly_key"] = key
+    hdr = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    body = b"".join([struct.pack("<I", len(hdr)), hdr, cls_idx.tobytes(), cls_id.tobytes(), conf.tobytes(), polys.tobytes()])
+    return MAGIC_COLUMNAR + cctx.compress(body)
+
+
+def unpack(blob: bytes) -> Dict[str, Any]:
+    blob = bytes(blob)  # BinaryField may hand back a memoryview
+    magic, data = blob[:4], zstandard.ZstdDecompressor().decompress(blob[4:])
+    if magic == MAGIC_JSON:
+        return json.loads(data)
+    if magic != MAGIC_COLUMNAR:
+        raise ValueError("Unknown result blob format")
+
+    (hlen,) = struct.unpack_from("<I", data, 0)
+    header = json.loads(data[4:4 + hlen])
+    n = header.pop("_n")
+    classes = header.pop("_classes")
+    key = header.pop("_poly_key")
+
+    off = 4 + hlen
+    cls_idx = np.frombuffer(data, dtype="<u2", count=n, offset=off); off += 2 * n
+    cls_id = np.frombuffer(data, dtype="<i4", count=n, offset=off); off += 4 * n
+    conf = np.frombuffer(data, dtype="<f4", count=n, offset=off); off += 4 * n
+    polys = np.frombuffer(data, dtype="<f4", count=n * 8, offset=off).reshape(-1, 8)
+
+    polys = np.round(polys.astype(np.float64), POLY_DIGITS).tolist()
+    conf = np.round(conf.astype(np.float64), CONF_DIGITS).tolist()
+    header["detections"] = [
+        {
+            "class": classes[cls_idx[i]],
+            "class_id": None if cls_id[i] < 0 else int(cls_id[i]),
+            "confidence": conf[i],
+            key: polys[i],
+        }
+        for i in range(n)
+    ]
+    return header
+
+
+def _close(a: float, b: float, digits: int) -> bool:
+    # f32 storage plus decimal rounding: half a unit in the last kept digit, plus f32 error
+    return abs(a - b) <= 0.5 * 10 ** -digits + abs(a) * float(np.finfo(np.float32).eps)
+
+
+def roundtrip_errors(payload: Dict[str, Any], blob: bytes, limit: int = 5) -> List[str]:
+    """
+    Differences between `payload` and what `blob` decodes to, beyond the documented
+    rounding (empty if it round-trips). Lists at most `limit` of them.
+    """
+    decoded = unpack(blob)
+    errors = []
+    for k in sorted(set(payload) | set(decoded)):
+        if k != "detections" and payload.get(k) != decoded.get(k):
+            errors.append(f"{k}: {payload.get(k)!r} != {decoded.get(k)!r}")
+    want, got = payload.get("detections") or [], decoded.get("detections") or []
+    if len(want) != len(got):
+        errors.append(f"detections: {len(want)} != {len(got)}")
+        return errors[:limit]
+    for i, (a, b) in enumerate(zip(want, got)):
+        key = "polygon" if "polygon" in a else "poly"
+        same = set(a) == set(b) and all(a[c] == b[c] for c in a if c not in ("confidence", key))
+        if same and "confidence" in a:
+            same = _close(float(a["confidence"]), b["confidence"], CONF_DIGITS)
+        if same and key in a:
+            pa, pb = list(a[key]), list(b[key])
+            same = pa == pb or (
+                len(pa) == len(pb) == 8 and all(_close(float(x), y, POLY_DIGITS) for x, y in zip(pa, pb))
+            )
+        if not same:
+            errors.append(f"detections[{i}]: {a!r} != {b!r}")
+            if len(errors) >= limit:
+                break
+    return errors[:limit]
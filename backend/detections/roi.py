@@ -0,0 +1,203 @@
+# detections/roi.py
+"""
+Region-of-interest helpers: run inference only inside user-supplied polygons.
+
+The image is cropped to the (padded, merged) bounding rectangles of the ROI
+polygons, the crops are batched through the model, and detections are
+shifted back to full-image coordinates and kept only if their centre lies
+inside one of the polygons.
+"""
+from __future__ import annotations
+
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from . import profiles
+
+Window = Tuple[int, int, int, int]   # x0, y0, x1, y1 (x1/y1 exclusive)
+
+WINDOW_PAD = 16     # px of context around each ROI so edge objects are not cut
+MAX_ROIS = 64
+
+
+def parse_rois(raw: Any) -> List[List[float]]:
+    """
+    Accepts a JSON string or list of polygons, each either flat
+    [x1,y1,x2,y2,...] or [[x1,y1],[x2,y2],...] (at least 3 points).
+    Returns flat float lists. Raises ValueError on anything else, including
+    NaN/Infinity.
+    """
+    if raw in (None, "", []):
+        return []
+    if isinstance(raw, (str, bytes)):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"rois must be JSON: {e}")
+    if not isinstance(raw, list):
+        raise ValueError("rois must be a list of polygons")
+    if len(raw) > MAX_ROIS:
+        raise ValueError(f"At most {MAX_ROIS} rois are allowed")
+
+    polys: List[List[float]] = []
+    for poly in raw:
+        if not isinstance(poly, list):
+            raise ValueError("Each roi must be a list of coordinates")
+        flat: List[Any] = []
+        for v in poly:
+            flat.extend(v if isinstance(v, list) else [v])
+        try:
+            flat = [float(v) for v in flat]
+        except (TypeError, ValueError):
+            raise ValueError("roi coordinates must be numbers")
+        if not all(math.isfinite(v) for v in flat):  # json.loads accepts NaN/Infinity
+            raise ValueError("roi coordinates must be finite numbers")
+        if len(flat) < 6 or len(flat) % 2:
+            raise ValueError("Each roi needs at least 3 (x, y) points")
+        polys.append(flat)
+    return polys
+
+
+def _overlaps(a: Window, b: Window) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def windows_for(rois: Sequence[Sequence[float]], width: int, height: int, pad: int = WINDOW_PAD) -> List[Window]:
+    """Padded bounding rectangles of the ROIs, clipped to the image; overlapping ones are merged."""
+    rects: List[Window] = []
+    for poly in rois:
+        xs, ys = poly[0::2], poly[1::2]
+        x0 = max(int(min(xs)) - pad, 0)
+        y0 = max(int(min(ys)) - pad, 0)
+        x1 = min(int(max(xs)) + pad + 1, width)
+        y1 = min(int(max(ys)) + pad + 1, height)
+        if x1 > x0 and y1 > y0:
+            rects.append((x0, y0, x1, y1))
+
+    merged = True
+    while merged:
+        merged = False
+        out: List[Window] = []
+        for r in rects:
+            for i, m in enumerate(out):
+                if _overlaps(r, m):
+                    out[i] = (min(r[0], m[0]), min(r[1], m[1]), max(r[2], m[2]), max(r[3], m[3]))
+                    merged = True
+                    break
+            else:
+                out.append(r)
+        rects = out
+    return rects
+
+
+def crop(image_pil, windows: Sequence[Window]) -> list:
+    return [image_pil.crop(w) for w in windows]
+
+
+def point_in_polygon(x: float, y: float, poly: Sequence[float]) -> bool:
+    """Even-odd ray cast; `poly` is flat [x1,y1,...]."""
+    inside = False
+    n = len(poly) // 2
+    j = n - 1
+    for i in range(n):
+        xi, yi = poly[2 * i], poly[2 * i + 1]
+        xj, yj = poly[2 * j], poly[2 * j + 1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def to_image_coords(
+    per_window: Sequence[List[Dict[str, Any]]],
+    windows: Sequence[Window],
+    rois: Sequence[Sequence[float]],
+    key: str,
+    ndigits: int | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Shift each window's detections (`d[key]` is a flat polygon) by the window
+    origin and drop any whose centre is outside every ROI polygon.
+    """
+    out: List[Dict[str, Any]] = []
+    for dets, (ox, oy, _, _) in zip(per_window, windows):
+        for d in dets:
+            pts = d[key]
+            shifted = [v + (ox if i % 2 == 0 else oy) for i, v in enumerate(pts)]
+            if ndigits is not None:
+                shifted = [round(v, ndigits) for v in shifted]
+            cx = sum(shifted[0::2]) / (len(shifted) // 2)
+            cy = sum(shifted[1::2]) / (len(shifted) // 2)
+            if any(point_in_polygon(cx, cy, p) for p in rois):
+                out.append({**d, key: shifted})
+    return out
+
+
+def batch_dims(windows: Sequence[Window]) -> Tuple[int, int]:
+    """(width, height) of the largest crop in the batch."""
+    return max(x1 - x0 for x0, _, x1, _ in windows), max(y1 - y0 for _, y0, _, y1 in windows)
+
+
+def batch_kwargs(profile, windows: Sequence[Window]) -> Dict[str, Any]:
+    """Profile predict kwargs sized for the largest crop in the batch."""
+    return profile.predict_kwargs(*batch_dims(windows))
+
+
+def summary(windows: Sequence[Window], width: int, height: int) -> Dict[str, Any]:
+    processed = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in windows)
+    return {
+        "windows": [list(w) for w in windows],
+        "pixels_processed": processed,
+        "pixels_total": width * height,
+    }
+
+
+def pixels(rois: Sequence[Sequence[float]], width: int, height: int) -> int:
+    """Pixels that will actually go through the model (used for cost estimates)."""
+    if not rois:
+        return width * height
+    return summary(windows_for(rois, width, height), width, height)["pixels_processed"]
+
+
+def predict(
+    model: Any,
+    source: Any,
+    width: int,
+    height: int,
+    profile_name: Optional[str],
+    model_key: str,
+    rois: Optional[Sequence[Sequence[float]]] = None,
+    **predict_args: Any,
+) -> Tuple[Optional[list], Optional[List[Window]], Dict[str, Any]]:
+    """
+    Timed, profile-sized `model.predict` on `source` (PIL image or path), only
+    inside `rois` when given. Returns (results, windows, profile meta):
+
+      - no rois: ([full-image results], None, meta)
+      - rois:    ([one result per window], windows, meta)
+      - every ROI outside the image: (None, [], meta); nothing was inferred
+    """
+    windows = windows_for(rois, width, height) if rois else None
+    if windows == []:
+        return None, [], profiles.skipped(profile_name)
+
+    processed = summary(windows, width, height)["pixels_processed"] if windows else width * height
+    with profiles.timed(profile_name or profiles.DEFAULT_PROFILE, model_key, processed):
+        if windows:
+            if isinstance(source, (str, bytes)):
+                with Image.open(source) as im:
+                    crops = crop(im.convert("RGB"), windows)
+            else:
+                crops = crop(source, windows)
+            # auto probes the crops, not the full image, so the ROI savings hold
+            prof = profiles.resolve(profile_name, model, crops, *batch_dims(windows))
+            kwargs = batch_kwargs(prof, windows)
+            results = model.predict(crops, verbose=False, **predict_args, **kwargs)
+        else:
+            prof = profiles.resolve(profile_name, model, source, width, height)
+            kwargs = prof.predict_kwargs(width, height)
+            results = model.predict(source, verbose=False, **predict_args, **kwargs)
+    return results, windows, {"name": prof.name, "imgsz": kwargs["imgsz"], "max_det": prof.max_det}
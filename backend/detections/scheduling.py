@@ -0,0 +1,298 @@
+# detections/scheduling.py
+"""
+Cost classification and per-client fair dispatch for async detection jobs.
+
+LargeDetectView stores every job as QUEUED; `dispatch_pending()` then hands
+jobs to Celery only while fewer than DETECTION_MAX_IN_FLIGHT are pending or
+running. Picking happens here, not in the broker, so one client's backlog
+cannot starve everyone else:
+
+  1. lower priority value first (HIGH < NORMAL < BULK, from estimated cost)
+  2. within a priority, the client with the smallest active/weight share
+  3. oldest job first
+
+Dispatchers are serialized (advisory lock) so concurrent callers cannot
+overshoot the slot limits; `reap_stale()` (beat, with a periodic dispatch)
+frees slots held by jobs whose message or worker was lost. Queue positions and
+ETAs (`QueueSnapshot`) replay the same picks.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import DetectionJob
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("PENDING", "PROCESSING")
+THROUGHPUT_SAMPLE = 50        # completed jobs used for the throughput estimate
+THROUGHPUT_CACHE_TTL = 30     # seconds
+
+
+# ---------- classification ----------
+def estimate_cost(pixels: int, model_name: str) -> float:
+    """Job cost in model-weighted megapixels."""
+    factor = settings.DETECTION_MODEL_COST.get(model_name, 1.0)
+    return (pixels / 1e6) * factor
+
+
+def classify(pixels: int, model_name: str) -> int:
+    """Map a job's estimated cost to a DetectionJob.PRIORITY_* value."""
+    cost = estimate_cost(pixels, model_name)
+    if cost <= settings.DETECTION_COST_HIGH_MAX:
+        return DetectionJob.PRIORITY_HIGH
+    if cost <= settings.DETECTION_COST_NORMAL_MAX:
+        return DetectionJob.PRIORITY_NORMAL
+    return DetectionJob.PRIORITY_BULK
+
+
+def queue_for(priority: int) -> str:
+    return settings.DETECTION_QUEUES.get(priority, settings.DETECTION_QUEUES[DetectionJob.PRIORITY_NORMAL])
+
+
+def _weight(client_id: str) -> float:
+    return max(settings.DETECTION_CLIENT_WEIGHTS.get(client_id, 1.0), 1e-6)
+
+
+# ---------- dispatch ----------
+def _pick_next(waiting: Dict[str, List[DetectionJob]], active: Dict[str, int], cap: int) -> Optional[DetectionJob]:
+    """
+    Pop the next job to dispatch from per-client queues (each sorted by priority,
+    age) and count it as active: priority, then active/weight share, then age.
+    """
+    best: Optional[str] = None
+    best_key = None
+    for client, jobs in waiting.items():
+        if not jobs or active.get(client, 0) >= cap:
+            continue
+        head = jobs[0]
+        key = (head.priority, active.get(client, 0) / _weight(client), head.created_at)
+        if best_key is None or key < best_key:
+            best, best_key = client, key
+    if best is None:
+        return None
+    active[best] = active.get(best, 0) + 1
+    return waiting[best].pop(0)
+
+
+DISPATCH_LOCK_ID = 0x59444554   # pg advisory lock key ("YDET")
+
+
+def _lock_dispatcher() -> None:
+    """
+    Serialize dispatchers for the rest of the transaction, so two callers never
+    both see the same free slots. SQLite (server/sqlite) already serializes
+    transactions by starting them IMMEDIATE.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", [DISPATCH_LOCK_ID])
+
+
+def _publish(job: DetectionJob) -> None:
+    """Send a dispatched job to its queue; put it back in line if the broker is unreachable."""
+    from .tasks import run_large_detection  # tasks imports this module
+
+    try:
+        run_large_detection.apply_async(
+            args=(str(job.id), job.image.path, job.confidence),
+            kwargs={"profile": job.profile or None, "rois": job.rois or None},
+            queue=job.queue,
+        )
+    except Exception:
+        logger.exception("Could not publish job %s; re-queued", job.id)
+        DetectionJob.objects.filter(id=job.id, status="PENDING").update(status="QUEUED", dispatched_at=None)
+
+
+def dispatch_pending() -> int:
+    """
+    Send as many QUEUED jobs to Celery as free slots allow.
+    Safe to call from any process; returns the number of jobs dispatched.
+    """
+    per_client_cap = settings.DETECTION_CLIENT_MAX_ACTIVE
+    with transaction.atomic():
+        _lock_dispatcher()
+        active: Dict[str, int] = dict(
+            DetectionJob.objects.filter(status__in=ACTIVE_STATUSES)
+            .values_list("client_id")
+            .annotate(n=Count("id"))
+        )
+        slots = settings.DETECTION_MAX_IN_FLIGHT - sum(active.values())
+        if slots <= 0:
+            return 0
+
+        # Head-of-line jobs per client: a client never needs more than its
+        # concurrency limit worth of rows considered in one pass, however many it queued.
+        heads = (
+            DetectionJob.objects.filter(status="QUEUED")
+            .annotate(rank=Window(
+                RowNumber(), partition_by=[F("client_id")], order_by=[F("priority").asc(), F("created_at").asc()],
+            ))
+            .filter(rank__lte=per_client_cap)
+            .order_by("client_id", "rank")
+        )
+        waiting: Dict[str, List[DetectionJob]] = {}
+        for job in heads:
+            waiting.setdefault(job.client_id, []).append(job)
+
+        picked: List[DetectionJob] = []
+        while len(picked) < slots:
+            job = _pick_next(waiting, active, per_client_cap)
+            if job is None:
+                break
+            picked.append(job)
+
+        now = timezone.now()
+        for job in picked:
+            job.status = "PENDING"
+            job.queue = queue_for(job.priority)
+            job.dispatched_at = now
+            job.save(update_fields=["status", "queue", "dispatched_at"])
+            transaction.on_commit(lambda j=job: _publish(j))
+    return len(picked)
+
+
+def reap_stale() -> Dict[str, int]:
+    """
+    Release slots held by jobs that will never finish on their own: PENDING jobs
+    whose message was lost go back in line, PROCESSING jobs whose worker died fail.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        _lock_dispatcher()
+        requeued = DetectionJob.objects.filter(
+            status="PENDING", dispatched_at__lt=now - timedelta(seconds=settings.DETECTION_PENDING_TIMEOUT),
+        ).update(status="QUEUED", dispatched_at=None)
+        failed = DetectionJob.objects.filter(
+            status="PROCESSING", started_at__lt=now - timedelta(seconds=settings.DETECTION_PROCESSING_TIMEOUT),
+        ).update(
+            status="FAILED", progress=100, finished_at=now, result_blob=None,
+            result=json.dumps({"success": False, "error": "Timed out (worker lost?)"}),
+        )
+    if requeued or failed:
+        logger.warning("Reaped stale jobs: %d re-queued, %d failed", requeued, failed)
+    return {"requeued": requeued, "failed": failed}
+
+
+# ---------- queue position / ETA ----------
+def seconds_per_megapixel(model_name: str) -> float:
+    """Recent measured throughput for `model_name` (falls back to the configured default)."""
+    key = f"detections:spmp:{model_name}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    recent = (
+        DetectionJob.objects.filter(
+            status="DONE", model_name=model_name, pixels__gt=0,
+            started_at__isnull=False, finished_at__isnull=False,
+        )
+        .order_by("-finished_at")
+        .values_list("pixels", "started_at", "finished_at")[:THROUGHPUT_SAMPLE]
+    )
+    total_px = 0
+    total_s = 0.0
+    for px, start, end in recent:
+        total_px += px
+        total_s += (end - start).total_seconds()
+    if total_px:
+        value = total_s / (total_px / 1e6)
+    else:
+        value = settings.DETECTION_DEFAULT_SECONDS_PER_MEGAPIXEL
+    cache.set(key, value, THROUGHPUT_CACHE_TTL)
+    return value
+
+
+def _estimated_seconds(pixels: int, model_name: str) -> float:
+    return (pixels / 1e6) * seconds_per_megapixel(model_name)
+
+
+class QueueSnapshot:
+    """
+    Dispatch order and finish times of every unfinished job, from one query.
+
+    Replays `dispatch_pending` forward in time: DETECTION_WORKER_SLOTS workers
+    run dispatched jobs in order, and whenever one finishes the dispatcher picks
+    again with the same per-client cap, fair-share key and in-flight limit.
+    Durations come from the measured seconds per megapixel.
+    """
+
+    def __init__(self):
+        now = timezone.now()
+        cap = settings.DETECTION_CLIENT_MAX_ACTIVE
+        max_in_flight = settings.DETECTION_MAX_IN_FLIGHT
+        jobs = list(
+            DetectionJob.objects.filter(status__in=("QUEUED",) + ACTIVE_STATUSES)
+            .only("id", "status", "client_id", "priority", "created_at", "pixels", "model_name",
+                  "dispatched_at", "started_at")
+            .order_by("priority", "created_at")
+        )
+        self.position: Dict[Any, int] = {}
+        self.eta: Dict[Any, float] = {}
+
+        active: Dict[str, int] = {}
+        waiting: Dict[str, List[DetectionJob]] = {}
+        running: List[Tuple[float, int, str]] = []   # (finish time, seq, client) heap
+        started: deque = deque()                      # dispatched, waiting for a worker
+        for job in jobs:
+            if job.status == "QUEUED":
+                waiting.setdefault(job.client_id, []).append(job)
+                continue
+            active[job.client_id] = active.get(job.client_id, 0) + 1
+            if job.status == "PROCESSING":
+                elapsed = (now - job.started_at).total_seconds() if job.started_at else 0.0
+                finish = max(_estimated_seconds(job.pixels, job.model_name) - elapsed, 0.0)
+                self.eta[job.id] = finish
+                heapq.heappush(running, (finish, len(running), job.client_id))
+        started.extend(sorted(
+            (j for j in jobs if j.status == "PENDING"), key=lambda j: (j.dispatched_at or j.created_at, j.created_at),
+        ))
+
+        free = max(settings.DETECTION_WORKER_SLOTS, 1) - len(running)
+        t = 0.0
+        seq = len(running)
+        while True:
+            while sum(active.values()) < max_in_flight:
+                job = _pick_next(waiting, active, cap)
+                if job is None:
+                    break
+                self.position[job.id] = len(self.position) + 1
+                started.append(job)
+            while free > 0 and started:
+                job = started.popleft()
+                finish = t + _estimated_seconds(job.pixels, job.model_name)
+                self.eta[job.id] = finish
+                heapq.heappush(running, (finish, seq, job.client_id))
+                seq += 1
+                free -= 1
+            if not running:
+                break
+            t, _, client = heapq.heappop(running)
+            active[client] -= 1
+            free += 1
+
+    def queue_position(self, job: DetectionJob) -> Optional[int]:
+        """1-based dispatch order among QUEUED jobs; 0 once dispatched; None when running or finished."""
+        if job.status == "QUEUED":
+            return self.position.get(job.id)
+        if job.status == "PENDING":
+            return 0
+        return None
+
+    def eta_seconds(self, job: DetectionJob) -> Optional[float]:
+        """Rough seconds until `job` finishes."""
+        if job.id not in self.eta:
+            return None
+        return round(self.eta[job.id], 1)
@@ -1,11 +1,51 @@
+import json
+
 from rest_framework import serializers
 from .models import DetectionJob
+from .profiles import PROFILE_NAMES
+from .roi import parse_rois
+from .scheduling import QueueSnapshot
 
 class DetectionJobSerializer(serializers.ModelSerializer):
+    result = serializers.SerializerMethodField()
+    priority = serializers.CharField(source="get_priority_display", read_only=True)
+    queue_position = serializers.SerializerMethodField()
+    eta_seconds = serializers.SerializerMethodField()
+
     class Meta:
         model = DetectionJob
-        fields = ["id", "image", "status", "result", "created_at"]
+        fields = [
+            "id", "image", "status", "progress", "result", "created_at",
+            "tag", "profile", "priority", "queue_position", "eta_seconds",
+        ]
+
+    def get_result(self, obj):
+        # Packed results are decoded here; the field keeps its original shape (a JSON string)
+        data = obj.result_data()
+        return json.dumps(data) if data is not None else None
+
+    def _queue(self) -> QueueSnapshot:
+        # One snapshot per response (ListJobsView passes it in); shared by list children
+        if "queue" not in self.context:
+            self.context["queue"] = QueueSnapshot()
+        return self.context["queue"]
+
+    def get_queue_position(self, obj):
+        return self._queue().queue_position(obj)
+
+    def get_eta_seconds(self, obj):
+        return self._queue().eta_seconds(obj)
 
 class DetectRequestSerializer(serializers.Serializer):
     image = serializers.ImageField()
     confidence = serializers.FloatField(default=0.25, min_value=0.0, max_value=1.0)
+    profile = serializers.ChoiceField(choices=PROFILE_NAMES, required=False, allow_blank=True)
+    tag = serializers.CharField(max_length=64, required=False, allow_blank=True)
+    # JSON list of polygons; parsed to flat [x1,y1,...] lists
+    rois = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_rois(self, value):
+        try:
+            return parse_rois(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
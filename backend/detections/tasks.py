@@ -3,12 +3,22 @@ from __future__ import annotations
 
 import os
 import json
+import logging
+import shutil
+from datetime import timedelta
+
 from celery import shared_task
 from django.db import transaction
+from django.db.models import Q
 from django.conf import settings
+from django.utils import timezone
+
+from .models import DetectionJob, JobSummary
+from .engine import get_engine
+from .scheduling import dispatch_pending, reap_stale
+from . import analytics, results, tiles, versions
 
-from .models import DetectionJob
-from .inference import run_detection
+logger = logging.getLogger(__name__)
 
 
 def _write_labels_txt(job_id: str, detections: list[dict]) -> str:
@@ -35,40 +45,86 @@ def _write_labels_txt(job_id: str, detections: list[dict]) -> str:
     return rel_path
 
 
+def _result_payload(job_id: str, detections: list[dict], meta: dict) -> dict:
+    # Build API-friendly result payload similar to your sample
+    # Round confidences to what the packed blob keeps, so stored and decoded results match
+    for d in detections:
+        d["confidence"] = round(float(d["confidence"]), results.CONF_DIGITS)
+    payload = {
+        "success": True,
+        "unique_id": str(job_id),
+        "detection_count": len(detections),
+        "detections": detections,
+        "image_width": meta.get("image_width"),
+        "image_height": meta.get("image_height"),
+        "profile": meta.get("profile"),
+    }
+    if "roi" in meta:
+        payload["roi"] = meta["roi"]
+    return payload
+
+
+def _store_result(job_id: str, payload: dict, model_version: str, **timing) -> DetectionJob:
+    """
+    Save a finished payload (labels file, packed result, version) and roll it into analytics.
+    `timing` may override started_at, which with finished_at feeds the throughput estimates.
+    """
+    # Optional: write labels .txt for download
+    labels_rel = _write_labels_txt(str(job_id), payload["detections"])
+
+    with transaction.atomic():
+        job = DetectionJob.objects.select_for_update().get(id=job_id)
+        job.set_result(payload)
+        job.labels_file = labels_rel
+        job.status = "DONE"
+        job.progress = 100
+        job.finished_at = timezone.now()
+        job.model_version = model_version
+        for field, value in timing.items():
+            setattr(job, field, value)
+        job.save(update_fields=[
+            "result", "result_blob", "labels_file", "status", "progress", "finished_at", "model_version",
+            *timing,
+        ])
+
+    try:
+        analytics.record_job(job, payload)
+    except Exception:
+        # Rollups are derived data (see rebuild_analytics); never fail the job over them
+        logger.exception("Could not record analytics for job %s", job_id)
+    return job
+
+
 @shared_task(bind=True)
-def run_large_detection(self, job_id: str, image_path: str, confidence: float = 0.25) -> None:
+def run_large_detection(
+    self,
+    job_id: str,
+    image_path: str,
+    confidence: float = 0.25,
+    profile: str | None = None,
+    rois: list[list[float]] | None = None,
+) -> None:
     """
     Celery task: run OBB detection and update the job record.
     """
     try:
         with transaction.atomic():
             job = DetectionJob.objects.select_for_update().get(id=job_id)
+            if job.status != "PENDING":
+                # Duplicate delivery, or the reaper already re-queued/failed this job
+                logger.info("Job %s is %s; skipping delivery", job_id, job.status)
+                return
             job.status = "PROCESSING"
             job.progress = 10
-            job.save(update_fields=["status", "progress"])
+            job.started_at = timezone.now()
+            if not job.image_hash:
+                job.image_hash = versions.image_hash(image_path)
+            job.save(update_fields=["status", "progress", "started_at", "image_hash"])
 
-        detections, meta = run_detection(image_path, confidence=confidence)
-
-        # Build API-friendly result payload similar to your sample
-        result_payload = {
-            "success": True,
-            "unique_id": str(job_id),
-            "detection_count": len(detections),
-            "detections": detections,
-            "image_width": meta.get("image_width"),
-            "image_height": meta.get("image_height"),
-        }
-
-        # Optional: write labels .txt for download
-        labels_rel = _write_labels_txt(str(job_id), detections)
-
-        with transaction.atomic():
-            job = DetectionJob.objects.select_for_update().get(id=job_id)
-            job.result = json.dumps(result_payload)
-            job.labels_file = labels_rel
-            job.status = "DONE"
-            job.progress = 100
-            job.save(update_fields=["result", "labels_file", "status", "progress"])
+        engine = get_engine()
+        model_version = engine.model_version(job.model_name)
+        detections, meta = engine.run_detection(image_path, confidence=confidence, profile=profile, rois=rois)
+        _store_result(job_id, _result_payload(job_id, detections, meta), model_version)
 
     except Exception as e:
         with transaction.atomic():
@@ -77,7 +133,205 @@ def run_large_detection(self, job_id: str, image_path: str, confidence: float =
                 job.status = "FAILED"
                 job.progress = 100
                 job.result = json.dumps({"success": False, "error": str(e)})
-                job.save(update_fields=["status", "progress", "result"])
+                job.result_blob = None
+                job.finished_at = timezone.now()
+                job.save(update_fields=["status", "progress", "result", "result_blob", "finished_at"])
             except Exception:
                 pass
-        raise
\ No newline at end of file
+        raise
+    finally:
+        # A slot just freed up: hand the next fair-share pick to the workers. Eager
+        # (inline) runs skip this: it would run the next job inside this one, recursing
+        # through the whole backlog; the submitting request's dispatch is enough there.
+        if not self.request.is_eager:
+            dispatch_pending()
+
+
+@shared_task(bind=True)
+def maintain_queue(self) -> dict:
+    """Periodic: free slots held by lost jobs, then dispatch whatever fits."""
+    stats = reap_stale()
+    stats["dispatched"] = dispatch_pending()
+    return stats
+
+
+# ---------- re-detection after weights change ----------
+def _count_classes(detections: list[dict]) -> dict:
+    counts: dict = {}
+    for d in detections:
+        name = str(d.get("class", ""))
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def _class_counts(job: DetectionJob) -> dict:
+    """Per-class detection counts of the job's stored result (from its summary when there is one)."""
+    summary = JobSummary.objects.filter(job=job).first()
+    if summary is not None:
+        return dict(summary.class_counts)
+    return _count_classes((job.result_data() or {}).get("detections") or [])
+
+
+def _current_twin(job: DetectionJob, model_version: str) -> DetectionJob | None:
+    """An up-to-date finished job for the same image and settings, whose result can be copied."""
+    if not job.image_hash:
+        return None
+    twins = (
+        DetectionJob.objects.filter(
+            status="DONE", image_hash=job.image_hash, model_name=job.model_name,
+            model_version=model_version, confidence=job.confidence, profile=job.profile,
+        )
+        .exclude(id=job.id)
+        .defer("result", "result_blob")
+    )
+    for twin in twins:
+        if (twin.rois or None) == (job.rois or None):
+            return twin
+    return None
+
+
+@shared_task(bind=True)
+def redetect_jobs(self, job_ids: list[str]) -> dict:
+    """
+    Re-run finished jobs whose results came from older weights, keeping each
+    job's confidence, profile and ROIs. Jobs already at the current version
+    (e.g. done by an earlier, interrupted pass) are skipped, and an image whose
+    content hash already has a current result gets a copy of it instead of
+    another inference. A job that fails keeps its previous result.
+
+    Returns counts plus per-job class counts before and after.
+    """
+    engine = get_engine()
+    out = {"redetected": 0, "reused": 0, "skipped": 0, "failed": 0, "jobs": []}
+    current: dict[str, str] = {}
+    for job_id in job_ids:
+        job = DetectionJob.objects.filter(id=job_id, status="DONE").first()
+        if job is None:
+            out["skipped"] += 1
+            continue
+        if job.model_name not in current:
+            current[job.model_name] = engine.model_version(job.model_name)
+        model_version = current[job.model_name]
+        if not model_version or job.model_version == model_version:
+            out["skipped"] += 1
+            continue
+
+        try:
+            image_path = job.image.path
+            if not job.image_hash:
+                job.image_hash = versions.image_hash(image_path)
+                DetectionJob.objects.filter(id=job.id).update(image_hash=job.image_hash)
+            old = _class_counts(job)
+
+            # started_at/finished_at must bracket this run's inference (or nothing, for a
+            # copied result) so seconds_per_megapixel and /profiles/ stay meaningful
+            twin = _current_twin(job, model_version)
+            if twin is not None:
+                payload = {**twin.result_data(), "unique_id": str(job.id)}
+                source = "reused"
+                started_at = None
+            else:
+                started_at = timezone.now()
+                detections, meta = engine.run_detection(
+                    image_path, confidence=job.confidence, profile=job.profile or None, rois=job.rois or None,
+                )
+                payload = _result_payload(str(job.id), detections, meta)
+                source = "redetected"
+            job = _store_result(str(job.id), payload, model_version, started_at=started_at)
+        except Exception:
+            logger.exception("Re-detection failed for job %s", job_id)
+            out["failed"] += 1
+            continue
+
+        out[source] += 1
+        out["jobs"].append({
+            "id": str(job.id),
+            "model": job.model_name,
+            "source": source,
+            "old": old,
+            "new": _count_classes(payload["detections"]),
+        })
+    return out
+
+
+def _media_path(rel: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, rel)
+
+
+def _archive_job(job: DetectionJob) -> str:
+    """
+    Copy the job's upload and labels under DETECTION_ARCHIVE_ROOT/<YYYY-MM>/<id>/ with its result.
+    The originals are removed by the caller once the row deletion commits.
+    """
+    dest = os.path.join(settings.DETECTION_ARCHIVE_ROOT, job.created_at.strftime("%Y-%m"), str(job.id))
+    os.makedirs(dest, exist_ok=True)
+    for rel in (job.image.name, job.labels_file):
+        if rel and os.path.exists(_media_path(rel)):
+            shutil.copy2(_media_path(rel), os.path.join(dest, os.path.basename(rel)))
+    with open(os.path.join(dest, "result.json"), "w", encoding="utf-8") as f:
+        json.dump({"status": job.status, "created_at": job.created_at.isoformat(), "result": job.result_data()}, f)
+    return dest
+
+
+def _remove_files(image_rel: str, labels_rel: str) -> None:
+    for rel in (image_rel, labels_rel):
+        if rel:
+            try:
+                os.remove(_media_path(rel))
+            except FileNotFoundError:
+                pass
+
+
+@shared_task(bind=True)
+def purge_expired_jobs(self) -> dict:
+    """
+    Periodic retention: delete (or archive, then delete) finished jobs older than
+    DETECTION_RETENTION_DAYS. Works in batches of DETECTION_RETENTION_BATCH rows; archive
+    copies happen before each batch's short delete transaction, which skips rows locked
+    by running tasks or changed since they were read.
+    """
+    days = settings.DETECTION_RETENTION_DAYS
+    if days <= 0:
+        return {"jobs": 0}
+    cutoff = timezone.now() - timedelta(days=days)
+    archive = settings.DETECTION_RETENTION_MODE == "archive"
+
+    expired = DetectionJob.objects.filter(created_at__lt=cutoff, status__in=("DONE", "FAILED"))
+    purged = 0
+    after = None
+    for _ in range(settings.DETECTION_RETENTION_MAX_BATCHES):
+        # Pick the batch (and copy archives) without holding locks; rows are only locked to delete.
+        qs = expired.order_by("created_at", "id")
+        if after is not None:
+            qs = qs.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1]))
+        if not archive:
+            qs = qs.defer("result", "result_blob")
+        batch = list(qs[: settings.DETECTION_RETENTION_BATCH])
+        if not batch:
+            break
+        after = (batch[-1].created_at, batch[-1].id)
+        archived = {job.id: _archive_job(job) for job in batch} if archive else {}
+
+        with transaction.atomic():
+            # Re-check under the lock: skip rows a task holds or that changed since they were read
+            # (a redetect bumps finished_at), so the archive matches what is deleted.
+            seen = {job.id: job.finished_at for job in batch}
+            locked = (
+                expired.select_for_update(skip_locked=True)
+                .filter(id__in=list(seen))
+                .only("id", "image", "labels_file", "created_at", "finished_at")
+            )
+            gone = [job for job in locked if job.finished_at == seen[job.id]]
+            for job in gone:
+                # Only drop files once the row deletion is committed; a rollback keeps rows and files
+                transaction.on_commit(lambda i=job.image.name, l=job.labels_file: _remove_files(i, l))
+                transaction.on_commit(lambda j=job: tiles.purge(j))
+            DetectionJob.objects.filter(id__in=[j.id for j in gone]).delete()
+
+        kept = set(archived) - {j.id for j in gone}
+        for job_id in kept:
+            shutil.rmtree(archived[job_id], ignore_errors=True)
+        purged += len(gone)
+        if len(batch) < settings.DETECTION_RETENTION_BATCH:
+            break
+    return {"jobs": purged, "mode": "archive" if archive else "delete"}
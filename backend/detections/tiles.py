@@ -0,0 +1,261 @@
+# detections/tiles.py
+"""
+Server-side overlay rendering as a tiled image pyramid.
+
+Very dense jobs (tens of thousands of polygons) are too heavy to ship as
+JSON and draw in the browser. Instead the client asks for 256px PNG tiles
+covering its viewport; each tile is rendered lazily with OpenCV from the
+job's detections (filtered by confidence band and class), cached on disk
+with LRU eviction and served with an ETag.
+
+Zoom levels follow the usual slippy-map layout: level `max_zoom` is full
+resolution and each lower level halves it, down to a single tile at 0.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+RENDER_VERSION = 1          # bump when drawing changes so ETags/cached tiles roll over
+INDEX_CACHE_JOBS = 8        # parsed detection arrays kept in memory per process
+EVICT_CHECK_EVERY = 64      # tile writes between cache size checks
+
+# BGR(A) palette, indexed by class id
+_PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+    (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0),
+    (255, 56, 132), (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255),
+]
+
+
+@dataclass(frozen=True)
+class TileParams:
+    min_conf: float = 0.0
+    max_conf: float = 1.0
+    classes: Tuple[str, ...] = ()    # empty = all classes
+    base: bool = False               # composite over the source image instead of transparent
+
+    def key(self) -> str:
+        return f"{self.min_conf:.4f}-{self.max_conf:.4f}-{','.join(self.classes)}-{int(self.base)}"
+
+
+# ---------- pyramid geometry ----------
+def tile_size() -> int:
+    return settings.DETECTION_TILE_SIZE
+
+
+def max_zoom(width: int, height: int) -> int:
+    return max(0, math.ceil(math.log2(max(width, height, 1) / tile_size())))
+
+
+def pyramid_info(width: int, height: int) -> Dict[str, Any]:
+    top = max_zoom(width, height)
+    levels = []
+    for z in range(top + 1):
+        scale = 2.0 ** (z - top)
+        w, h = math.ceil(width * scale), math.ceil(height * scale)
+        levels.append({
+            "zoom": z, "width": w, "height": h,
+            "cols": math.ceil(w / tile_size()), "rows": math.ceil(h / tile_size()),
+        })
+    return {"tile_size": tile_size(), "max_zoom": top, "levels": levels}
+
+
+# ---------- detection index ----------
+class DetectionIndex:
+    """Columnar view of a job's detections for fast per-tile selection."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.width = int(payload.get("image_width") or 0)
+        self.height = int(payload.get("image_height") or 0)
+        dets = list(payload.get("detections") or [])
+        polys = [d.get("polygon") or d.get("poly") or [] for d in dets]
+        self.polys = np.array([p[:8] if len(p) >= 8 else [0.0] * 8 for p in polys], dtype=np.float32).reshape(-1, 8)
+        self.conf = np.array([float(d.get("confidence", 0.0)) for d in dets], dtype=np.float32)
+        self.cls = np.array([str(d.get("class", "")) for d in dets], dtype=object)
+        self.cls_id = np.array([int(d.get("class_id") or 0) for d in dets], dtype=np.int32)
+        xs, ys = self.polys[:, 0::2], self.polys[:, 1::2]
+        self.aabb = np.stack([xs.min(1), ys.min(1), xs.max(1), ys.max(1)], axis=1) if len(dets) else np.zeros((0, 4))
+
+    def class_counts(self) -> Dict[str, int]:
+        names, counts = np.unique(self.cls, return_counts=True) if len(self.cls) else ([], [])
+        return {str(n): int(c) for n, c in zip(names, counts)}
+
+    def select(self, x0: float, y0: float, x1: float, y1: float, params: TileParams) -> np.ndarray:
+        m = (
+            (self.aabb[:, 2] >= x0) & (self.aabb[:, 0] <= x1)
+            & (self.aabb[:, 3] >= y0) & (self.aabb[:, 1] <= y1)
+            & (self.conf >= params.min_conf) & (self.conf <= params.max_conf)
+        )
+        if params.classes:
+            m &= np.isin(self.cls, list(params.classes))
+        return np.nonzero(m)[0]
+
+
+_index_lock = threading.Lock()
+_index_cache: "OrderedDict[str, DetectionIndex]" = OrderedDict()
+
+
+def version(job) -> str:
+    """Changes whenever the job's result could have changed."""
+    stamp = job.finished_at or job.created_at
+    return f"{job.id}:{stamp.isoformat() if stamp else ''}:{RENDER_VERSION}"
+
+
+def get_index(job) -> DetectionIndex:
+    key = version(job)
+    with _index_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+    deferred = {"result", "result_blob"} & job.get_deferred_fields()
+    if deferred:
+        job.refresh_from_db(fields=sorted(deferred))  # one query, not one per field
+    index = DetectionIndex(job.result_data() or {})
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_JOBS:
+            _index_cache.popitem(last=False)
+    return index
+
+
+# ---------- rendering ----------
+def _base_region(image_path: str, x0: int, y0: int, x1: int, y1: int, out_w: int, out_h: int) -> np.ndarray:
+    """Source image region scaled to (out_w, out_h), as BGRA."""
+    import cv2
+
+    with Image.open(image_path) as im:
+        full_w, full_h = im.size
+        # JPEG: let the decoder downscale (DCT scaling) when the tile is a reduced level
+        reduce = max(1, int((x1 - x0) / max(out_w, 1)))
+        if reduce > 1:
+            im.draft("RGB", (max(full_w // reduce, 1), max(full_h // reduce, 1)))
+        sx, sy = im.size[0] / full_w, im.size[1] / full_h
+        region = im.convert("RGB").crop((int(x0 * sx), int(y0 * sy), int(x1 * sx), int(y1 * sy)))
+        region = region.resize((out_w, out_h), Image.BILINEAR)
+    return cv2.cvtColor(np.asarray(region), cv2.COLOR_RGB2BGRA)
+
+
+def render_tile(job, z: int, x: int, y: int, params: TileParams) -> Optional[bytes]:
+    """PNG bytes for one tile, or None if (z, x, y) is outside the pyramid."""
+    import cv2  # deferred: keeps OpenCV out of processes that never render tiles
+
+    index = get_index(job)
+    width, height = index.width, index.height
+    top = max_zoom(width, height)
+    if z < 0 or z > top:
+        return None
+    size = tile_size()
+    scale = 2.0 ** (z - top)           # level pixels per source pixel
+    span = size / scale                # source pixels covered by one tile
+    x0, y0 = x * span, y * span
+    if x < 0 or y < 0 or x0 >= width or y0 >= height:
+        return None
+    x1, y1 = min(x0 + span, width), min(y0 + span, height)
+
+    canvas = np.zeros((size, size, 4), dtype=np.uint8)
+    if params.base:
+        out_w = min(size, max(1, round((x1 - x0) * scale)))
+        out_h = min(size, max(1, round((y1 - y0) * scale)))
+        canvas[:out_h, :out_w] = _base_region(job.image.path, int(x0), int(y0), int(x1), int(y1), out_w, out_h)
+
+    sel = index.select(x0, y0, x1, y1, params)
+    if len(sel):
+        pts = ((index.polys[sel].reshape(-1, 4, 2) - (x0, y0)) * scale).round().astype(np.int32)
+        thickness = 2 if scale >= 0.5 else 1
+        for cid in np.unique(index.cls_id[sel]):
+            group = pts[index.cls_id[sel] == cid]
+            b, g, r = _PALETTE[int(cid) % len(_PALETTE)]
+            cv2.polylines(canvas, list(group), isClosed=True, color=(b, g, r, 255),
+                          thickness=thickness, lineType=cv2.LINE_AA)
+
+    ok, buf = cv2.imencode(".png", canvas)
+    return buf.tobytes() if ok else None
+
+
+# ---------- disk cache ----------
+def etag(job, z: int, x: int, y: int, params: TileParams) -> str:
+    raw = f"{version(job)}|{z}/{x}/{y}|{params.key()}"
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def _cache_path(job, tag: str) -> str:
+    return os.path.join(settings.DETECTION_TILE_CACHE_DIR, str(job.id), tag.strip('"') + ".png")
+
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def _evict_if_needed() -> None:
+    """Drop least-recently-used tiles (by mtime, bumped on every hit) until under the size cap."""
+    root = settings.DETECTION_TILE_CACHE_DIR
+    files = []
+    total = 0
+    for dirpath, _, names in os.walk(root):
+        for n in names:
+            p = os.path.join(dirpath, n)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+    limit = settings.DETECTION_TILE_CACHE_MAX_BYTES
+    if total <= limit:
+        return
+    files.sort()
+    target = limit * 0.9   # leave headroom so we do not evict on every write
+    for _, sz, p in files:
+        if total <= target:
+            break
+        try:
+            os.remove(p)
+            total -= sz
+        except OSError:
+            pass
+
+
+def get_tile(job, z: int, x: int, y: int, params: TileParams) -> Optional[bytes]:
+    """Cached tile bytes, rendering and storing them on first request."""
+    global _writes
+    path = _cache_path(job, etag(job, z, x, y, params))
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # LRU clock
+        return data
+    except FileNotFoundError:
+        pass
+
+    data = render_tile(job, z, x, y, params)
+    if data is None:
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    with _writes_lock:
+        _writes += 1
+        check = _writes % EVICT_CHECK_EVERY == 0
+    if check:
+        _evict_if_needed()
+    return data
+
+
+def purge(job) -> None:
+    """Remove every cached tile of `job`."""
+    shutil.rmtree(os.path.join(settings.DETECTION_TILE_CACHE_DIR, str(job.id)), ignore_errors=True)
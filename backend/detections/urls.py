@@ -1,10 +1,20 @@
 from django.urls import path
-from .views import BasicDetectView, LargeDetectView, ListJobsView, DownloadLabelsView
+from .views import (
+    BasicDetectView, LargeDetectView, ListJobsView, DownloadLabelsView, ProfilesView, JobTilesView, JobTileView,
+    LivenessView, ReadinessView, AnalyticsView, QueueStatsView,
+)
 
 urlpatterns = [
     path("detect/basic/", BasicDetectView.as_view(), name="detect-basic"),
     path("detect/large/", LargeDetectView.as_view(), name="detect-large"),
     path("jobs/", ListJobsView.as_view(), name="jobs"),
+    path("queue/", QueueStatsView.as_view(), name="queue"),
+    path("profiles/", ProfilesView.as_view(), name="profiles"),
+    path("jobs/<uuid:job_id>/tiles/", JobTilesView.as_view(), name="job-tiles"),
+    path("jobs/<uuid:job_id>/tiles/<int:z>/<int:x>/<int:y>.png", JobTileView.as_view(), name="job-tile"),
+    path("analytics/", AnalyticsView.as_view(), name="analytics"),
+    path("health/live/", LivenessView.as_view(), name="health-live"),
+    path("health/ready/", ReadinessView.as_view(), name="health-ready"),
     
     # download/<uuid>.txt
     path("download/<str:fname>", DownloadLabelsView.as_view(), name="download-labels"),
@@ -0,0 +1,65 @@
+# detections/versions.py
+"""
+Which weights produced a result, and which image it was produced from.
+
+Finished jobs record `model_version` (a short SHA-256 of the weights file)
+and `image_hash` (SHA-256 of the upload). When weights are replaced, jobs
+whose version no longer matches are stale; `manage.py redetect` reprocesses
+just those, reusing the result of any up-to-date job with the same image.
+
+Hashes are cached per (path, mtime, size), so checking the current version
+costs one stat() unless the file actually changed. The same stamp tells
+loaders to drop a model whose weights were replaced on disk.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+VERSION_CHARS = 16
+_CHUNK = 1 << 20
+
+_lock = threading.Lock()
+_digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def stamp(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of `path`, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def weights_version(path: str) -> str:
+    """Short hash of the weights at `path` ("" if missing)."""
+    st = stamp(path)
+    if st is None:
+        return ""
+    with _lock:
+        cached = _digests.get(path)
+    if cached and cached[0] == st:
+        return cached[1]
+    version = file_digest(path)[:VERSION_CHARS]
+    with _lock:
+        _digests[path] = (st, version)
+    return version
+
+
+def image_hash(path: str) -> str:
+    """Content hash of an uploaded image ("" if it is gone)."""
+    try:
+        return file_digest(path)
+    except OSError:
+        return ""
@@ -5,8 +5,11 @@ import tempfile
 from typing import Dict, Any, List, Tuple
 
 from django.db import transaction
+from django.db.models import Count, F, Sum
 from django.conf import settings
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 from django.core.files.storage import default_storage
 
 from PIL import Image
@@ -19,10 +22,10 @@ from drf_spectacular.types import OpenApiTypes
 
 from .models import DetectionJob
 from .serializers import DetectionJobSerializer, DetectRequestSerializer
-from .tasks import run_large_detection
-
-# 🔁 NEW: central inference import (bundled inside detections/)
-from .detect_models import run_inference
+from .scheduling import QueueSnapshot, classify, dispatch_pending
+from . import analytics, profiles, roi, tiles, versions
+from .models import AggregateCounter
+from .engine import get_engine
 
 
 # ---------- helpers ----------
@@ -65,6 +68,17 @@ def _aabb_from_obb_polygon(pts: List[float]) -> Tuple[int, int, int, int]:
     return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
 
 
+def _client_id(request) -> str:
+    """Identity used for per-client fair sharing: X-Client-Id header > user > remote address."""
+    header = (request.headers.get("X-Client-Id") or "").strip()
+    if header:
+        return header[:64]
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return request.META.get("REMOTE_ADDR", "")[:64]
+
+
 def _image_dims(image_path: str) -> Tuple[int, int]:
     """Return (width,height) using PIL, falling back to (0,0) on error."""
     try:
@@ -82,8 +96,10 @@ class BasicDetectView(APIView):
       - image OR file: uploaded image
       - model: "spike" | "spikelet" | "fhb" | "fdk"
       - conf: float (low; the frontend filters client-side with the slider)
+      - profile: "fast" | "balanced" | "accurate" | "auto" (optional; defaults per model)
+      - rois: JSON list of polygons (optional); only these regions are inferred
     Returns JSON:
-      { image_width, image_height, detections: [{class, class_id, confidence, poly:[x1,y1,...,x4,y4]}] }
+      { image_width, image_height, profile, roi?, detections: [{class, class_id, confidence, poly:[x1,y1,...,x4,y4]}] }
     """
     parser_classes = [MultiPartParser, FormParser]
 
@@ -101,6 +117,18 @@ class BasicDetectView(APIView):
                     "file":  {"type": "string", "format": "binary", "description": "Alternate key for image"},
                     "model": {"type": "string", "enum": ["spike", "spikelet", "fhb", "fdk"], "default": "spike"},
                     "conf":  {"type": "number", "default": 0.05, "description": "Server-side min confidence (keep low)"},
+                    "profile": {
+                        "type": "string",
+                        "enum": profiles.PROFILE_NAMES,
+                        "description": "Speed/accuracy profile (input size, letterbox, max detections); "
+                                       "'auto' sizes from a low-res probe. Defaults to the model's profile.",
+                    },
+                    "rois": {
+                        "type": "string",
+                        "description": "Optional JSON list of polygons in image pixels, "
+                                       "e.g. [[x1,y1,x2,y2,x3,y3,...], ...]. Only these regions are "
+                                       "inferred; detections whose centre is outside them are dropped.",
+                    },
                 },
                 "required": ["image"]
             }
@@ -112,6 +140,15 @@ class BasicDetectView(APIView):
                     "properties": {
                         "image_width": {"type": "integer", "example": 1920},
                         "image_height": {"type": "integer", "example": 1080},
+                        "profile": {
+                            "type": "object",
+                            "example": {"name": "fast", "imgsz": [384, 640], "max_det": 300},
+                        },
+                        "roi": {
+                            "type": "object",
+                            "description": "Present when rois were given",
+                            "example": {"windows": [[120, 80, 900, 700]], "pixels_processed": 483600, "pixels_total": 786432},
+                        },
                         "detections": {
                             "type": "array",
                             "items": {
@@ -162,6 +199,11 @@ class BasicDetectView(APIView):
             conf = float(request.data.get("conf", 0.05))
         except (ValueError, TypeError):
             conf = 0.05
+        profile = (request.data.get("profile") or "").strip().lower() or None
+        try:
+            rois = roi.parse_rois(request.data.get("rois"))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
 
         # Open as PIL and run inference
         try:
@@ -170,7 +212,7 @@ class BasicDetectView(APIView):
             return Response({"detail": f"Invalid image: {e}"}, status=400)
 
         try:
-            payload = run_inference(model_name, image, conf=conf)
+            payload = get_engine().run_inference(model_name, image, conf=conf, profile=profile, rois=rois)
         except FileNotFoundError as e:
             return Response({"detail": str(e)}, status=404)
         except ValueError as e:
@@ -193,6 +235,10 @@ class LargeDetectView(APIView):
         Submit an image for asynchronous processing using Celery workers.
         Ideal for large images or when processing multiple images concurrently.
         Returns a job ID that can be used to check processing status.
+
+        Jobs are classified by estimated cost (pixels x model) into high/normal/bulk
+        queues and dispatched fairly across clients (identified by the optional
+        `X-Client-Id` header), so a large batch from one client does not block others.
         """,
         request={
             'multipart/form-data': {
@@ -210,6 +256,20 @@ class LargeDetectView(APIView):
                         'maximum': 1.0,
                         'default': 0.25,
                         'description': 'Confidence threshold for detections'
+                    },
+                    'profile': {
+                        'type': 'string',
+                        'enum': profiles.PROFILE_NAMES,
+                        'description': 'Speed/accuracy profile; defaults to MODEL_PROFILE'
+                    },
+                    'rois': {
+                        'type': 'string',
+                        'description': 'Optional JSON list of polygons; only these regions are inferred'
+                    },
+                    'tag': {
+                        'type': 'string',
+                        'maxLength': 64,
+                        'description': 'Optional grouping label (e.g. trial id) for /analytics/'
                     }
                 },
                 'required': ['image']
@@ -222,7 +282,8 @@ class LargeDetectView(APIView):
                     'properties': {
                         'unique_id': {'type': 'string', 'format': 'uuid', 'example': '123e4567-e89b-12d3-a456-426614174000'},
                         'success': {'type': 'boolean', 'example': True},
-                        'message': {'type': 'string', 'example': 'Job submitted successfully'}
+                        'message': {'type': 'string', 'example': 'Job submitted successfully'},
+                        'priority': {'type': 'string', 'enum': ['High', 'Normal', 'Bulk'], 'example': 'High'},
                     }
                 },
                 description='Job successfully submitted for async processing'
@@ -252,6 +313,8 @@ class LargeDetectView(APIView):
 
         image = request.FILES["image"]
         confidence = float(s.validated_data.get("confidence", 0.25))
+        profile = s.validated_data.get("profile") or ""
+        rois = s.validated_data.get("rois") or None
 
         # Persist the upload via the model so we have a stable path
         job = DetectionJob.objects.create(
@@ -259,24 +322,288 @@ class LargeDetectView(APIView):
             confidence=confidence,
             status="QUEUED",
             progress=0,
+            client_id=_client_id(request),
+            profile=profile,
+            rois=rois,
+            tag=s.validated_data.get("tag", "").strip(),
         )
 
-        # Use the stored file path (served by MEDIA_ROOT) for the worker
-        image_path = job.image.path  # should exist once saved
-        # Call Celery task with correct signature: (job_id, image_path, confidence)
-        run_large_detection.delay(str(job.id), image_path, confidence)
+        # Classify by cost so small jobs are not stuck behind mosaics
+        w, h = _image_dims(job.image.path)
+        job.pixels = roi.pixels(rois or [], w, h)
+        job.priority = classify(job.pixels, job.model_name)
+        job.image_hash = versions.image_hash(job.image.path)
+        job.save(update_fields=["pixels", "priority", "image_hash"])
+
+        # The job waits as QUEUED until a worker slot is free for this client
+        dispatch_pending()
 
         return Response(
-            {"unique_id": str(job.id), "success": True},
+            {"unique_id": str(job.id), "success": True, "priority": job.get_priority_display()},
             status=status.HTTP_202_ACCEPTED,
         )
 
 
 class ListJobsView(generics.ListAPIView):
-    """List all detection jobs with filtering and pagination support."""
+    """List all detection jobs (with queue position and ETA for unfinished ones)."""
     serializer_class = DetectionJobSerializer
     queryset = DetectionJob.objects.all().order_by("-created_at")
 
+    def get_serializer_context(self):
+        # Positions/ETAs for every row come from one replay of the dispatcher
+        return {**super().get_serializer_context(), "queue": QueueSnapshot()}
+
+
+class QueueStatsView(APIView):
+    """
+    GET /queue/
+    Number of unfinished jobs per status and priority (cheap; for dashboards and load tests).
+    """
+
+    @extend_schema(
+        summary="Async job queue depth",
+        responses={200: OpenApiResponse(
+            response={"type": "object"},
+            examples=[OpenApiExample("Queue", value={"QUEUED": 12, "PENDING": 4, "PROCESSING": 2, "by_priority": {"High": 3, "Normal": 9, "Bulk": 6}})],
+        )},
+        tags=["Detection"],
+    )
+    def get(self, request):
+        unfinished = DetectionJob.objects.filter(status__in=("QUEUED", "PENDING", "PROCESSING"))
+        by_status = dict(unfinished.values_list("status").annotate(n=Count("id")))
+        by_priority = dict(unfinished.values_list("priority").annotate(n=Count("id")))
+        labels = dict(DetectionJob.PRIORITY_CHOICES)
+        return Response({
+            **{st: by_status.get(st, 0) for st in ("QUEUED", "PENDING", "PROCESSING")},
+            "by_priority": {labels[p]: by_priority.get(p, 0) for p in labels},
+        })
+
+
+class ProfilesView(APIView):
+    """
+    GET /profiles/
+    Inference profiles plus measured latency/throughput: synchronous calls served
+    by this process, and completed async jobs grouped by profile.
+    """
+
+    @extend_schema(
+        summary="List inference profiles and their measured throughput",
+        responses={200: OpenApiResponse(description="Profiles, per-process stats and async job stats")},
+        tags=["Detection"],
+    )
+    def get(self, request):
+        jobs = (
+            DetectionJob.objects.filter(
+                status="DONE", started_at__isnull=False, finished_at__isnull=False, pixels__gt=0
+            )
+            .values("profile", "model_name")
+            .annotate(jobs=Count("id"), pixels=Sum("pixels"), seconds=Sum(F("finished_at") - F("started_at")))
+            .order_by("profile", "model_name")
+        )
+        job_stats = []
+        for row in jobs:
+            seconds = row["seconds"].total_seconds() if row["seconds"] else 0.0
+            job_stats.append({
+                "profile": row["profile"] or "default",
+                "model": row["model_name"],
+                "jobs": row["jobs"],
+                "mean_latency_s": round(seconds / row["jobs"], 3),
+                "megapixels_per_s": round((row["pixels"] / 1e6) / seconds, 3) if seconds else None,
+            })
+        return Response({
+            "profiles": profiles.describe(),
+            "default": profiles.DEFAULT_PROFILE,
+            "sync": profiles.profile_stats(),
+            "jobs": job_stats,
+        })
+
+
+def _tile_params(request) -> tiles.TileParams:
+    """Parse ?min_conf=&max_conf=&classes=a,b&base=1; raises ValueError on bad input."""
+    q = request.query_params
+    min_conf = float(q.get("min_conf", 0.0))
+    max_conf = float(q.get("max_conf", 1.0))
+    if not (0.0 <= min_conf <= max_conf <= 1.0):
+        raise ValueError("Require 0 <= min_conf <= max_conf <= 1")
+    classes = tuple(sorted(c for c in (q.get("classes") or "").split(",") if c))
+    return tiles.TileParams(min_conf=min_conf, max_conf=max_conf, classes=classes, base=q.get("base") == "1")
+
+
+def _finished_job(job_id) -> DetectionJob:
+    # The result is only needed when tiles.get_index misses its cache; it loads it then.
+    job = get_object_or_404(DetectionJob.objects.defer("result", "result_blob"), id=job_id)
+    if job.status != "DONE":
+        raise Http404("Job has no results yet")
+    return job
+
+
+class JobTilesView(APIView):
+    """
+    GET /jobs/<uuid>/tiles/
+    Pyramid geometry and class counts for a finished job, plus the tile URL template.
+    """
+
+    @extend_schema(
+        summary="Describe the overlay tile pyramid of a job",
+        responses={
+            200: OpenApiResponse(description="Image size, tile size, zoom levels, class counts, tile URL template"),
+            404: OpenApiResponse(description="Unknown job or job not finished"),
+        },
+        tags=["Detection"],
+    )
+    def get(self, request, job_id):
+        job = _finished_job(job_id)
+        index = tiles.get_index(job)
+        info = tiles.pyramid_info(index.width, index.height)
+        return Response({
+            "image_width": index.width,
+            "image_height": index.height,
+            **info,
+            "detection_count": int(len(index.conf)),
+            "classes": index.class_counts(),
+            "url": request.build_absolute_uri(request.path) + "{z}/{x}/{y}.png",
+        })
+
+
+class JobTileView(APIView):
+    """
+    GET /jobs/<uuid>/tiles/<z>/<x>/<y>.png
+    One 256px overlay tile, rendered on first request and cached on disk.
+    """
+
+    @extend_schema(
+        summary="Fetch one overlay tile",
+        description=(
+            "Detections drawn as polygons on a transparent PNG (or over the source image with base=1). "
+            "Filter with min_conf/max_conf and a comma-separated classes list. "
+            "Send If-None-Match with the previous ETag to get 304 when unchanged."
+        ),
+        parameters=[
+            OpenApiParameter("min_conf", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Lower confidence bound (default 0)"),
+            OpenApiParameter("max_conf", OpenApiTypes.FLOAT, OpenApiParameter.QUERY, description="Upper confidence bound (default 1)"),
+            OpenApiParameter("classes", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Comma-separated class names (default all)"),
+            OpenApiParameter("base", OpenApiTypes.INT, OpenApiParameter.QUERY, description="1 = draw over the source image"),
+        ],
+        responses={
+            200: OpenApiResponse(response={"type": "string", "format": "binary"}, description="PNG tile"),
+            304: OpenApiResponse(description="Not modified"),
+            400: OpenApiResponse(description="Bad filter parameters"),
+            404: OpenApiResponse(description="Unknown job, unfinished job or tile outside the pyramid"),
+        },
+        tags=["Detection"],
+    )
+    def get(self, request, job_id, z: int, x: int, y: int):
+        try:
+            params = _tile_params(request)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        job = _finished_job(job_id)
+
+        tag = tiles.etag(job, z, x, y, params)
+        if tag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+            resp = HttpResponseNotModified()
+        else:
+            data = tiles.get_tile(job, z, x, y, params)
+            if data is None:
+                raise Http404("Tile outside the pyramid")
+            resp = HttpResponse(data, content_type="image/png")
+        resp["ETag"] = tag
+        patch_cache_control(resp, public=True, max_age=settings.DETECTION_TILE_MAX_AGE)
+        return resp
+
+
+class AnalyticsView(APIView):
+    """
+    GET /analytics/?group=day|tag&model=&class=&start=&end=
+    Cross-job rollups (detections per image, positive rate, density, confidence
+    histogram) read from incrementally maintained counters.
+    """
+
+    @extend_schema(
+        summary="Aggregate detection statistics by day or tag",
+        parameters=[
+            OpenApiParameter("group", OpenApiTypes.STR, OpenApiParameter.QUERY, enum=["day", "tag"], description="Grouping (default day)"),
+            OpenApiParameter("model", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Model key filter"),
+            OpenApiParameter("class", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Restrict counts to one class"),
+            OpenApiParameter("start", OpenApiTypes.STR, OpenApiParameter.QUERY, description="First key (YYYY-MM-DD for day)"),
+            OpenApiParameter("end", OpenApiTypes.STR, OpenApiParameter.QUERY, description="Last key (inclusive)"),
+        ],
+        responses={
+            200: OpenApiResponse(
+                response={
+                    "type": "object",
+                    "properties": {
+                        "group": {"type": "string"},
+                        "rows": {"type": "array", "items": {"type": "object"}},
+                    },
+                },
+                description="One row per (day or tag, model)",
+                examples=[
+                    OpenApiExample(
+                        "Spikes per image by date",
+                        value={"group": "day", "rows": [{
+                            "key": "2024-06-01", "model": "obb", "class": "spike", "jobs": 42,
+                            "detections": 1890, "detections_per_image": 45.0, "positive_jobs": 41,
+                            "positive_rate": 0.9762, "megapixels": 504.0, "density_per_mp": 3.75,
+                            "conf_hist": [0, 0, 12, 40, 88, 150, 300, 500, 600, 200],
+                        }]},
+                    )
+                ],
+            ),
+            400: OpenApiResponse(description="Unknown group"),
+        },
+        tags=["Analytics"],
+    )
+    def get(self, request):
+        q = request.query_params
+        group = q.get("group", AggregateCounter.SCOPE_DAY)
+        if group not in dict(AggregateCounter.SCOPE_CHOICES):
+            return Response({"detail": "group must be 'day' or 'tag'"}, status=400)
+        rows = analytics.query(
+            group,
+            model_name=q.get("model") or None,
+            class_name=q.get("class", ""),
+            start=q.get("start") or None,
+            end=q.get("end") or None,
+        )
+        return Response({"group": group, "rows": rows})
+
+
+class LivenessView(APIView):
+    """GET /health/live/ — the process is up and serving (never touches models)."""
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(summary="Liveness probe", responses={200: OpenApiResponse(description="Process is up")}, tags=["Health"])
+    def get(self, request):
+        return Response({"status": "up"})
+
+
+class ReadinessView(APIView):
+    """
+    GET /health/ready/ — 200 once the required models are loaded and warm, else 503.
+    The first probe starts warming in the background, so plain management commands
+    and autoreloads never pay for it.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(
+        summary="Readiness probe",
+        responses={
+            200: OpenApiResponse(description="Models warm"),
+            503: OpenApiResponse(description="Models still loading (or failed to load)"),
+        },
+        tags=["Health"],
+    )
+    def get(self, request):
+        engine = get_engine()
+        info = engine.status()
+        if not info["ready"] and not info["warming"]:
+            engine.warm_in_background()
+            info = engine.status()
+        return Response(info, status=200 if info["ready"] else 503)
+
 
 class DownloadLabelsView(APIView):
     """
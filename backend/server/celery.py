@@ -1,7 +1,27 @@
 import os
 from celery import Celery
+from celery.signals import celeryd_after_setup, worker_process_init
+
+from detections import cputune
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+# Thread pools are sized at torch import, so apply the tuned layout first
+cputune.apply_env()
+
 app = Celery("server")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@celeryd_after_setup.connect
+def _check_cpu_topology(sender, instance, **kwargs):
+    cputune.check_oversubscription(instance.concurrency)
+
+
+@worker_process_init.connect
+def _warm_models(**kwargs):
+    # Optional: load models as each pool process starts instead of on its first task
+    if os.environ.get("DETECTION_WARM_ON_START", "0") == "1":
+        from detections.engine import get_engine
+
+        get_engine().warm_in_background()
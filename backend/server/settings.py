@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from detections import cputune
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
@@ -68,6 +70,16 @@ DATABASES = {
     }
 }
 
+# Local/load-test setups can run without Postgres: DB_ENGINE=sqlite
+if os.environ.get("DB_ENGINE") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "server.sqlite",   # BEGIN IMMEDIATE + WAL, see server/sqlite/base.py
+            "NAME": os.environ.get("SQLITE_PATH", str(BASE_DIR / "db.sqlite3")),
+            "OPTIONS": {"timeout": 30},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = "en-us"
@@ -79,7 +91,7 @@ STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
 MEDIA_URL = "/media/"
-MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", BASE_DIR / "media"))
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -89,3 +101,93 @@ CORS_ALLOW_ALL_ORIGINS = os.environ.get("CORS_ALLOW_ALL", "1") == "1"
 # Celery
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+# Run tasks inline in the submitting process (local runs without a broker/worker)
+CELERY_TASK_ALWAYS_EAGER = os.environ.get("CELERY_TASK_ALWAYS_EAGER", "0") == "1"
+
+# CPU topology written by `manage.py tune_cpu` (see detections/cputune.py).
+# Its "processes" becomes the worker concurrency, and the dispatch slot count below,
+# unless set explicitly.
+CPU_TUNING_FILE = cputune.TUNING_FILE
+_tuned_processes = os.environ.get("CELERY_WORKER_CONCURRENCY") or cputune.load_tuning().get("processes")
+if _tuned_processes:
+    CELERY_WORKER_CONCURRENCY = int(_tuned_processes)
+
+# Async detection scheduling (see detections/scheduling.py)
+# Jobs are held in the DB as QUEUED and only handed to Celery when a slot frees up,
+# so ordering across clients is decided here rather than by broker FIFO.
+DETECTION_QUEUES = {
+    0: os.environ.get("DETECTION_QUEUE_HIGH", "detect.high"),
+    1: os.environ.get("DETECTION_QUEUE_NORMAL", "detect.normal"),
+    2: os.environ.get("DETECTION_QUEUE_BULK", "detect.bulk"),
+}
+# Cost (megapixels x model factor) at or below which a job is HIGH / NORMAL; above -> BULK
+DETECTION_COST_HIGH_MAX = float(os.environ.get("DETECTION_COST_HIGH_MAX", "12"))
+DETECTION_COST_NORMAL_MAX = float(os.environ.get("DETECTION_COST_NORMAL_MAX", "80"))
+# Relative per-pixel cost of each model key, e.g. "obb=1.0,spikelet=1.5"
+DETECTION_MODEL_COST = {
+    k.strip(): float(v)
+    for k, v in (
+        item.split("=", 1)
+        for item in os.environ.get("DETECTION_MODEL_COST", "obb=1.0").split(",")
+        if "=" in item
+    )
+}
+# Jobs a single client may have dispatched/running at once
+DETECTION_CLIENT_MAX_ACTIVE = int(os.environ.get("DETECTION_CLIENT_MAX_ACTIVE", "2"))
+# Fair-share weights per client id, e.g. "lab-a=2,lab-b=1" (unlisted clients weigh 1)
+DETECTION_CLIENT_WEIGHTS = {
+    k.strip(): float(v)
+    for k, v in (
+        item.split("=", 1)
+        for item in os.environ.get("DETECTION_CLIENT_WEIGHTS", "").split(",")
+        if "=" in item
+    )
+}
+# Concurrent task slots across all workers; bounds what sits in the broker at once.
+# Defaults to the tuned/configured worker concurrency (one worker); set it to the total
+# when running several worker hosts.
+DETECTION_WORKER_SLOTS = int(os.environ.get("DETECTION_WORKER_SLOTS") or _tuned_processes or 2)
+DETECTION_MAX_IN_FLIGHT = int(os.environ.get("DETECTION_MAX_IN_FLIGHT", str(DETECTION_WORKER_SLOTS * 2)))
+# Seconds before a dispatched job that never started is re-queued (lost broker message),
+# and before a running job is failed (worker died); checked every DETECTION_MAINTAIN_INTERVAL
+DETECTION_PENDING_TIMEOUT = int(os.environ.get("DETECTION_PENDING_TIMEOUT", "900"))
+DETECTION_PROCESSING_TIMEOUT = int(os.environ.get("DETECTION_PROCESSING_TIMEOUT", "3600"))
+DETECTION_MAINTAIN_INTERVAL = float(os.environ.get("DETECTION_MAINTAIN_INTERVAL", "60"))
+# ETA fallback until enough jobs have completed to measure throughput
+DETECTION_DEFAULT_SECONDS_PER_MEGAPIXEL = float(os.environ.get("DETECTION_DEFAULT_SECONDS_PER_MEGAPIXEL", "1.5"))
+
+# Server-side overlay tiles (see detections/tiles.py)
+DETECTION_TILE_SIZE = int(os.environ.get("DETECTION_TILE_SIZE", "256"))
+DETECTION_TILE_CACHE_DIR = os.environ.get("DETECTION_TILE_CACHE_DIR", str(MEDIA_ROOT / "tiles"))
+DETECTION_TILE_CACHE_MAX_BYTES = int(os.environ.get("DETECTION_TILE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DETECTION_TILE_MAX_AGE = int(os.environ.get("DETECTION_TILE_MAX_AGE", "3600"))
+
+# Inference engine (see detections/engine.py): a key of detections.engine.ENGINES or a dotted path
+DETECTION_ENGINE = os.environ.get("DETECTION_ENGINE", "ultralytics")
+# Models that must be warm before /api/health/ready/ reports ready (empty = all with weights present)
+DETECTION_WARM_MODELS = [m.strip() for m in os.environ.get("DETECTION_WARM_MODELS", "").split(",") if m.strip()]
+# DETECTION_ENGINE=stub: simulated inference cost and detections per image
+DETECTION_STUB_SECONDS_PER_MP = float(os.environ.get("DETECTION_STUB_SECONDS_PER_MP", "0.2"))
+DETECTION_STUB_DETECTIONS = int(os.environ.get("DETECTION_STUB_DETECTIONS", "50"))
+
+# Job data retention (see detections/tasks.py: purge_expired_jobs)
+# Finished jobs older than this many days lose their upload, labels, tiles and row.
+# Off (0 = keep forever) unless set: enabling it on an existing install purges the backlog.
+DETECTION_RETENTION_DAYS = int(os.environ.get("DETECTION_RETENTION_DAYS", "0"))
+# "delete" removes files; "archive" moves them (plus result.json) under DETECTION_ARCHIVE_ROOT first
+DETECTION_RETENTION_MODE = os.environ.get("DETECTION_RETENTION_MODE", "delete")
+DETECTION_ARCHIVE_ROOT = os.environ.get("DETECTION_ARCHIVE_ROOT", str(MEDIA_ROOT / "archive"))
+# Rows handled per transaction, and batches per run, so the jobs table is never locked for long
+DETECTION_RETENTION_BATCH = int(os.environ.get("DETECTION_RETENTION_BATCH", "200"))
+DETECTION_RETENTION_MAX_BATCHES = int(os.environ.get("DETECTION_RETENTION_MAX_BATCHES", "50"))
+
+CELERY_BEAT_SCHEDULE = {
+    "maintain-detection-queue": {
+        "task": "detections.tasks.maintain_queue",
+        "schedule": DETECTION_MAINTAIN_INTERVAL,
+    },
+    "purge-expired-jobs": {
+        "task": "detections.tasks.purge_expired_jobs",
+        "schedule": float(os.environ.get("DETECTION_RETENTION_INTERVAL", "3600")),
+    },
+}
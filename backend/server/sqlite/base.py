@@ -0,0 +1,22 @@
+# server/sqlite/base.py
+"""
+SQLite backend for local and load-test runs (DB_ENGINE=sqlite).
+
+Concurrent requests and inline Celery tasks all write to the jobs table. With
+SQLite's default deferred transactions, a transaction that reads and then
+writes fails with "database is locked" instead of waiting for the lock. Here
+every transaction starts with BEGIN IMMEDIATE (what Django 5.1's
+OPTIONS["transaction_mode"] does), so writers queue on the busy timeout.
+WAL mode lets readers run alongside the writer.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")